@@ -0,0 +1,219 @@
+import socket
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict
+
+worker_status = defaultdict(int)
+
+from file_protocol import FileProtocol, SendFile, TERMINATOR
+from worker_stats import operation_field
+from control_port import serve_control
+from runtime_config import RuntimeConfig, MB, worker_count
+from profiler import Profiler
+from memtrace import MemoryStats, MemoryTracer
+from file_interface import CACHE_BUDGET
+fp = FileProtocol(worker_status)
+
+SERVER_ADDRESS = ('0.0.0.0', 6667)
+BUFFER_SIZE = 1024 * 1024
+# Antrian accept yang panjang supaya ribuan koneksi serentak tidak ditolak kernel
+BACKLOG = 4096
+# Seberapa sering event loop memeriksa PAUSE/RESUME
+POLL_INTERVAL = 0.2
+# Ukuran buffer dan budget cache bisa diubah lewat port kontrol (BUFFER, CACHE)
+config = RuntimeConfig(BUFFER_SIZE, CACHE_BUDGET)
+profiler = Profiler(config)
+memory = MemoryStats(shared=False)
+memory_tracer = MemoryTracer(config, memory)
+fp.status_providers['memory'] = memory.snapshot
+
+
+class Server:
+    """
+    Varian server dengan asyncio: semua koneksi dilayani satu event loop,
+    sedangkan operasi disk (begin, feed, membaca chunk response) dijalankan
+    di ThreadPoolExecutor berukuran tetap. Koneksi yang lambat hanya
+    menunggu di event loop dan tidak memakan thread.
+    """
+    def __init__(self, ipaddress='0.0.0.0', port=6667, max_workers=10):
+        self.ipinfo = (ipaddress, port)
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        # Koneksi yang sedang dilayani, dipakai DRAIN
+        self.active = 0
+
+    def workers(self):
+        return self.max_workers
+
+    def resize(self, count):
+        # Tugas yang sudah masuk executor lama tetap diselesaikan olehnya
+        old, self.executor = self.executor, ThreadPoolExecutor(max_workers=count)
+        self.max_workers = count
+        old.shutdown(wait=False)
+
+    def inflight(self):
+        return self.active
+
+    def control_workers(self, params):
+        # WORKERS <n>: jumlah thread untuk operasi disk
+        count = worker_count(params)
+        self.resize(count)
+        logging.warning(f"Jumlah worker diubah menjadi {count}")
+        return {'status': 'OK', 'workers': count}
+
+    def control_config(self, params):
+        return {'status': 'OK', 'workers': self.max_workers, 'inflight': self.active, **config.snapshot()}
+
+    def commands(self):
+        return {
+            'workers': self.control_workers, 'config': self.control_config,
+            'drain': lambda params: config.drain(self.inflight, params), **config.commands(),
+        }
+
+    async def disk(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def handle_client(self, reader, writer):
+        address = writer.get_extra_info('peername')
+        logging.warning(f"Accepted connection dari {address}")
+        self.active += 1
+        try:
+            config.apply(fp)
+            with memory_tracer.request() as mem:
+                summary = await self.serve(reader, writer)
+                mem.record(summary)
+            if summary and summary['command'] != 'status':
+                worker_status['success'] += 1
+                worker_status['bytes_sent'] += summary['bytes_out']
+                worker_status['bytes_received'] += summary['bytes_in']
+                worker_status[operation_field(summary['command'])] += 1
+        except Exception as e:
+            logging.error(f"Error handling client {address}: {e}")
+            worker_status['fail'] += 1
+        finally:
+            self.active -= 1
+            writer.close()
+
+    async def serve(self, reader, writer):
+        # Sama dengan FileProtocol.serve, tetapi recv/send lewat event loop dan kerja disk lewat executor
+        buffer_size = config.buffer_size
+        buffer = bytearray()
+        scan = 0
+        while (found := fp.find_header(buffer, scan)) is None:
+            data = await reader.read(buffer_size)
+            if not data:
+                return None
+            scan = max(0, len(buffer) - len(TERMINATOR) + 1)
+            buffer += data
+
+        end, body_start = found
+        bytes_in = len(buffer)
+        transfer = await self.disk(fp.begin, bytes(buffer[:end]), body_start == end + 1)
+        rest = bytes(buffer[body_start:])
+        del buffer
+        try:
+            if rest:
+                await self.disk(transfer.feed, rest)
+            while not transfer.done:
+                data = await reader.read(buffer_size)
+                if not data:
+                    raise ConnectionError('koneksi terputus sebelum data selesai diterima')
+                bytes_in += len(data)
+                await self.disk(transfer.feed, data)
+        except Exception:
+            transfer.abort()
+            raise
+
+        loop = asyncio.get_running_loop()
+        bytes_out = 0
+        chunks = transfer.response()
+        try:
+            while (chunk := await self.disk(next, chunks, None)) is not None:
+                if isinstance(chunk, SendFile):
+                    bytes_out += await loop.sendfile(writer.transport, chunk.file, chunk.offset, chunk.count)
+                else:
+                    writer.write(chunk)
+                    await writer.drain()
+                    bytes_out += len(chunk)
+        finally:
+            await self.disk(chunks.close)
+        return {'command': transfer.command, 'bytes_in': bytes_in, 'bytes_out': bytes_out}
+
+    async def run(self):
+        logging.warning(f"Server berjalan di {self.ipinfo} dengan max_workers={self.max_workers} dalam mode asyncio")
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind(self.ipinfo)
+        listener.listen(BACKLOG)
+        listener.setblocking(False)
+        loop = asyncio.get_running_loop()
+        tasks = set()
+        try:
+            while True:
+                # Saat pause socket tidak di-accept; koneksi baru menunggu di backlog kernel
+                if config.paused:
+                    await asyncio.sleep(POLL_INTERVAL)
+                    continue
+                if not await self.readable(loop, listener) or config.paused:
+                    continue
+                while True:
+                    try:
+                        connection, _ = listener.accept()
+                    except BlockingIOError:
+                        break
+                    reader, writer = await asyncio.open_connection(sock=connection)
+                    task = asyncio.create_task(self.handle_client(reader, writer))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+        finally:
+            listener.close()
+
+    @staticmethod
+    async def readable(loop, listener):
+        # True jika ada koneksi menunggu dalam POLL_INTERVAL
+        ready = loop.create_future()
+        loop.add_reader(listener, lambda: ready.done() or ready.set_result(True))
+        try:
+            return await asyncio.wait_for(ready, POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            loop.remove_reader(listener)
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING)
+
+    try:
+        max_workers = int(input("Masukkan jumlah thread untuk operasi disk: "))
+    except ValueError:
+        print("Input harus berupa angka.")
+        return
+
+    try:
+        cache_mb = int(input("Masukkan budget cache GET dalam MB (default 256): "))
+        config.set('cache_budget', cache_mb * MB)
+    except Exception:
+        print("Menggunakan budget cache default")
+
+    if input("Aktifkan penyimpanan deduplikasi (content-addressed)? [y/N]: ").strip().lower() == 'y':
+        fp.file.dedup = True
+
+    # worker_status hanya diubah dari event loop; dict() menyalinnya tanpa melepas GIL
+    control_stats = lambda params: {'status': 'OK', **dict(worker_status)}
+    svr = Server(SERVER_ADDRESS[0], SERVER_ADDRESS[1], max_workers=max_workers)
+    commands = {'stats': control_stats, 'profile': profiler.control, 'memory': memory_tracer.control, **svr.commands()}
+    threading.Thread(target=serve_control, args=(svr.workers, commands), daemon=True).start()
+    profiler.follow()
+    memory_tracer.follow()
+    try:
+        asyncio.run(svr.run())
+    except KeyboardInterrupt:
+        logging.warning("Server shutting down.")
+    finally:
+        svr.executor.shutdown(wait=False)
+
+if __name__ == "__main__":
+    main()
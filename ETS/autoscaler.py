@@ -0,0 +1,156 @@
+import math
+import time
+import logging
+import threading
+
+from latency import percentile
+from runtime_config import MAX_WORKERS
+
+INTERVAL = 1.0
+# Tambah worker jika salah satu batas atas terlampaui GROW_SAMPLES kali berturut-turut
+BUSY_HIGH = 0.85
+QUEUE_HIGH = 1.0
+QUEUE_WAIT_HIGH = 0.05
+GROW_SAMPLES = 2
+GROW_FACTOR = 1.5
+# Kurangi worker jika sepi SHRINK_SAMPLES kali berturut-turut; jarak BUSY_LOW ke BUSY_HIGH adalah hysteresis
+BUSY_LOW = 0.3
+SHRINK_SAMPLES = 10
+SHRINK_FACTOR = 0.75
+# Setelah mengubah ukuran, tunggu sebelum keputusan berikutnya supaya efeknya sempat terlihat
+COOLDOWN = 5.0
+# Bobot sampel baru pada rata-rata busy ratio (EWMA)
+SMOOTHING = 0.3
+# Percentil waktu tunggu antrian baru dipakai jika ada cukup request dalam satu interval
+MIN_WAIT_SAMPLES = 5
+
+
+class Autoscaler:
+    """
+    Mengubah jumlah worker di antara minimum dan maximum berdasarkan
+    kedalaman antrian, busy ratio worker dan p90 waktu tunggu antrian
+    (dari histogram latensi fase queue, dihitung per interval).
+    probe() mengembalikan {'workers', 'busy', 'queued'} dan resize(n)
+    mengubah ukuran pool. Setiap keputusan dicatat di log.
+    """
+    def __init__(self, probe, resize, minimum, maximum, latency=None, enabled=True, lowest=1, highest=MAX_WORKERS):
+        self.probe = probe
+        self.resize = resize
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency = latency
+        self.enabled = enabled
+        # Ukuran terkecil yang didukung pool (mt_server butuh satu thread per lane) dan batas atas dari port kontrol
+        self.lowest = lowest
+        self.highest = highest
+        self.lock = threading.Lock()
+        self.busy_ratio = 0.0
+        self.queue_wait = None
+        self.high = 0
+        self.low = 0
+        self.cooldown_until = 0
+        self.decisions = 0
+        self.last_decision = None
+        self.last_counts = latency.phase_counts('queue') if latency else None
+
+    def start(self):
+        threading.Thread(target=self.run, name='autoscaler', daemon=True).start()
+        return self
+
+    def run(self):
+        while True:
+            time.sleep(INTERVAL)
+            try:
+                self.tick()
+            except Exception as e:
+                logging.error(f"Error di autoscaler: {e}")
+
+    def recent_queue_wait(self):
+        # p90 waktu tunggu antrian (detik) untuk request yang selesai sejak tick sebelumnya
+        if self.latency is None:
+            return None
+        counts = self.latency.phase_counts('queue')
+        window = list(map(int.__sub__, counts, self.last_counts))
+        self.last_counts = counts
+        if sum(window) < MIN_WAIT_SAMPLES:
+            return None
+        return percentile(window, 0.9) / 1e6
+
+    def tick(self):
+        with self.lock:
+            sample = self.probe()
+            workers = sample['workers']
+            if not workers:
+                # Pool belum berjalan
+                return
+            self.busy_ratio += SMOOTHING * (min(sample['busy'] / workers, 1.0) - self.busy_ratio)
+            self.queue_wait = self.recent_queue_wait()
+            if not self.enabled:
+                return
+
+            reasons = []
+            if self.busy_ratio >= BUSY_HIGH:
+                reasons.append(f"busy {self.busy_ratio:.0%}")
+            if sample['queued'] >= QUEUE_HIGH * workers:
+                reasons.append(f"antrian {sample['queued']}")
+            if self.queue_wait is not None and self.queue_wait >= QUEUE_WAIT_HIGH:
+                reasons.append(f"p90 tunggu {self.queue_wait * 1000:.0f} ms")
+            if reasons:
+                self.high, self.low = self.high + 1, 0
+            elif self.busy_ratio <= BUSY_LOW and not sample['queued']:
+                self.high, self.low = 0, self.low + 1
+            else:
+                self.high = self.low = 0
+
+            if workers < self.minimum or workers > self.maximum:
+                self.apply(workers, min(max(workers, self.minimum), self.maximum), "di luar batas min/max")
+            elif time.monotonic() < self.cooldown_until:
+                return
+            elif self.high >= GROW_SAMPLES and workers < self.maximum:
+                target = min(self.maximum, max(workers + 1, math.ceil(workers * GROW_FACTOR)))
+                self.apply(workers, target, ', '.join(reasons))
+            elif self.low >= SHRINK_SAMPLES and workers > self.minimum:
+                target = max(self.minimum, min(workers - 1, math.floor(workers * SHRINK_FACTOR)))
+                self.apply(workers, target, f"busy {self.busy_ratio:.0%}, antrian kosong")
+
+    def apply(self, workers, target, reason):
+        logging.warning(f"Autoscaler: worker {workers} -> {target} ({reason})")
+        self.resize(target)
+        self.high = self.low = 0
+        self.cooldown_until = time.monotonic() + COOLDOWN
+        self.decisions += 1
+        self.last_decision = {'time': time.time(), 'from': workers, 'to': target, 'reason': reason}
+
+    def control(self, params):
+        # AUTOSCALE [on|off] [min=<n>] [max=<n>]
+        enabled, bounds = self.enabled, {'min': self.minimum, 'max': self.maximum}
+        for param in params:
+            key, _, value = param.partition('=')
+            if key in ('on', 'off') and not value:
+                enabled = key == 'on'
+            elif key in bounds and value.isdigit():
+                if int(value) < self.lowest:
+                    raise ValueError(f"{key} minimal {self.lowest}")
+                if int(value) > self.highest:
+                    raise ValueError(f"{key} maksimal {self.highest}")
+                bounds[key] = int(value)
+            else:
+                raise ValueError(f"opsi autoscale tidak dikenal: {param}")
+        if bounds['min'] > bounds['max']:
+            raise ValueError('min tidak boleh lebih besar dari max')
+        with self.lock:
+            self.enabled = enabled
+            self.minimum, self.maximum = bounds['min'], bounds['max']
+        return {'status': 'OK', **self.stats()}
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'workers': self.probe()['workers'],
+            'min': self.minimum,
+            'max': self.maximum,
+            'busy_ratio': round(self.busy_ratio, 3),
+            'queue_wait_p90_ms': round(self.queue_wait * 1000, 3) if self.queue_wait is not None else None,
+            'decisions': self.decisions,
+            'last_decision': self.last_decision,
+        }
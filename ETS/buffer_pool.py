@@ -0,0 +1,101 @@
+import threading
+from contextlib import contextmanager
+
+TERMINATOR = b"\r\n\r\n"
+# Jumlah buffer bebas yang disimpan; buffer yang dikembalikan saat pool penuh dibuang
+POOL_LIMIT = 32
+
+
+class BufferPool:
+    """
+    Kumpulan bytearray yang sudah dialokasikan untuk recv_into, supaya
+    loop penerima tidak membuat objek bytes baru (dan mengisi 1 MiB dengan
+    nol) di setiap recv. Pool tidak pernah menahan peminjam: jika kosong,
+    buffer baru dibuat dan nanti disimpan selama pool belum penuh.
+    Semua buffer berukuran sama; jika ukuran diminta berubah (perintah
+    BUFFER di port kontrol), buffer lama dilepas.
+    """
+    def __init__(self, limit=POOL_LIMIT):
+        self.lock = threading.Lock()
+        self.limit = limit
+        self.size = 0
+        self.free = []
+        self.allocated = 0
+        self.reused = 0
+
+    def acquire(self, size):
+        with self.lock:
+            if size != self.size:
+                self.size = size
+                self.free.clear()
+            if self.free:
+                self.reused += 1
+                return self.free.pop()
+            self.allocated += 1
+        return bytearray(size)
+
+    def release(self, buffer):
+        with self.lock:
+            if len(buffer) == self.size and len(self.free) < self.limit:
+                self.free.append(buffer)
+
+    @contextmanager
+    def buffer(self, size):
+        buffer = self.acquire(size)
+        try:
+            yield buffer
+        finally:
+            self.release(buffer)
+
+    def stats(self):
+        with self.lock:
+            return {'buffer_size': self.size, 'free': len(self.free), 'limit': self.limit,
+                    'allocated': self.allocated, 'reused': self.reused}
+
+
+def find_terminator(buffer, scan, end):
+    found = buffer.find(TERMINATOR, scan, end)
+    return None if found < 0 else (found, found + len(TERMINATOR))
+
+
+class FrameReader:
+    """
+    Membaca dari socket langsung ke buffer dengan recv_into. read_frame()
+    hanya memeriksa byte yang baru masuk (ditambah 3 byte sebelumnya) saat
+    mencari terminator, jadi header yang datang sedikit-sedikit tidak
+    di-scan ulang dari awal. Setelah header, recv() menulis ulang buffer
+    dari awal dan mengembalikan memoryview yang hanya berlaku sampai
+    pemanggilan recv() berikutnya.
+    """
+    def __init__(self, connection, buffer):
+        self.connection = connection
+        self.buffer = buffer
+        self.view = memoryview(buffer)
+        self.length = 0
+
+    def fill(self):
+        if self.length == len(self.buffer):
+            # Header lebih besar dari buffer: pindah ke buffer dua kali lipat di luar pool
+            grown = bytearray(len(self.buffer) * 2)
+            grown[:self.length] = self.view[:self.length]
+            self.buffer = grown
+            self.view = memoryview(grown)
+        n = self.connection.recv_into(self.view[self.length:])
+        self.length += n
+        return n
+
+    def read_frame(self, find=find_terminator):
+        # find(buffer, scan, end) -> (akhir header, awal body) atau None jika belum lengkap
+        scan = 0
+        while (found := find(self.buffer, scan, self.length)) is None:
+            scan = max(0, self.length - len(TERMINATOR) + 1)
+            if not self.fill():
+                return None
+        return found
+
+    def recv(self, limit):
+        n = self.connection.recv_into(self.view[:min(limit, len(self.buffer))])
+        return self.view[:n]
+
+
+pool = BufferPool()
@@ -0,0 +1,55 @@
+import json
+import socket
+import logging
+import threading
+
+CONTROL_ADDRESS = ('0.0.0.0', 6668)
+TERMINATOR = b"\r\n\r\n"
+# Berapa lama koneksi kontrol ditunggu untuk perintah berikutnya
+COMMAND_TIMEOUT = 5
+
+
+def handle_control(conn, address, workers, commands):
+    with conn:
+        logging.warning(f"Sending max_workers to {address}")
+        conn.sendall(workers().to_bytes(4, 'big'))
+        conn.settimeout(COMMAND_TIMEOUT)
+        buffer = b''
+        try:
+            while True:
+                while TERMINATOR not in buffer:
+                    data = conn.recv(4096)
+                    if not data:
+                        return
+                    buffer += data
+                request, buffer = buffer.split(TERMINATOR, 1)
+                parts = request.decode().strip().split(' ')
+                handler = commands.get(parts[0].lower())
+                if handler is None:
+                    response = {'status': 'ERROR', 'data': 'perintah kontrol tidak dikenal'}
+                else:
+                    try:
+                        response = handler(parts[1:])
+                    except Exception as e:
+                        response = {'status': 'ERROR', 'data': str(e)}
+                conn.sendall(json.dumps(response).encode() + TERMINATOR)
+        except OSError:
+            return
+
+
+def serve_control(workers, commands=None, address=CONTROL_ADDRESS):
+    """
+    Port kontrol: setiap koneksi langsung menerima jumlah worker saat ini
+    (4 byte big-endian, workers adalah fungsi yang mengembalikannya) seperti
+    sebelumnya, sehingga stress test lama tetap jalan.
+    Setelah itu client boleh mengirim perintah teks yang diakhiri "\\r\\n\\r\\n"
+    (mis. STATS) dan setiap perintah dijawab JSON.
+    """
+    commands = commands or {}
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        s.bind(address)
+        s.listen()
+        while True:
+            conn, addr = s.accept()
+            threading.Thread(target=handle_control, args=(conn, addr, workers, commands), daemon=True).start()
@@ -1,31 +1,120 @@
+import io
+import os
 import socket
 import json
 import base64
+import hashlib
+import mmap
+import tarfile
+import tempfile
+import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from file_delta import BLOCK_SIZE, compute_delta, encode_op
+from file_compress import SAMPLE_SIZE, choose_codec, compress_chunks, decompress_chunks, decompressor
+from buffer_pool import pool as buffer_pool
 
 MAX_PACKET = 1024 * 1024
+RESUME_SEGMENT = 8 * 1024 * 1024
+
+
+def read_body(stream, resp: dict, sink=None) -> None:
+    """
+    Baca data biner yang mengikuti header JSON (data_framing) ke sink.
+    Tanpa sink, isinya disimpan di resp['data_bytes']. Untuk framing tar,
+    sink adalah direktori tujuan dan setiap berkas diekstrak begitu tiba.
+    Data dengan data_encoding (zlib/lzma) di-dekompres per chunk.
+    """
+    framing = resp.get('data_framing')
+    if framing is None:
+        return
+    if framing == 'tar':
+        resp['data_extracted'] = extract_tar(stream, sink or '.')
+        return
+    out = sink if sink is not None else io.BytesIO()
+    write = out.write
+    if resp.get('data_encoding'):
+        decomp = decompressor(resp['data_encoding'])
+
+        def write(data):
+            for piece in decompress_chunks(decomp, data):
+                out.write(piece)
+    if framing == 'length':
+        remaining = resp['data_length']
+        # readinto ke buffer pool: tidak ada objek bytes baru per potongan
+        with buffer_pool.buffer(MAX_PACKET) as buffer:
+            view = memoryview(buffer)
+            while remaining > 0:
+                n = stream.readinto(view[:min(MAX_PACKET, remaining)])
+                if not n:
+                    raise ConnectionError("Koneksi terputus sebelum data selesai diterima")
+                write(view[:n])
+                remaining -= n
+    elif framing == 'chunked':
+        # Setiap chunk diawali panjang 4 byte big-endian; panjang 0 menandai akhir data
+        while size := int.from_bytes(read_exact(stream, 4), 'big'):
+            write(read_exact(stream, size))
+    else:
+        raise ValueError(f"Framing tidak dikenal: {framing}")
+    if sink is None:
+        resp['data_bytes'] = out.getvalue()
+
+
+def read_exact(stream, size: int) -> bytes:
+    data = stream.read(size)
+    if len(data) < size:
+        raise ConnectionError("Koneksi terputus sebelum data selesai diterima")
+    return data
+
+
+def decode_file(resp: dict) -> bytes:
+    # Isi data_file dari GET base64, di-dekompres jika server mengirimnya terkompresi
+    data = base64.b64decode(resp['data_file'])
+    if resp.get('data_encoding'):
+        data = b''.join(decompress_chunks(decompressor(resp['data_encoding']), data))
+    return data
+
+
+def extract_tar(stream, directory: str) -> list:
+    extracted = []
+    with tarfile.open(fileobj=stream, mode='r|') as archive:
+        for member in archive:
+            if hasattr(tarfile, 'data_filter'):
+                archive.extract(member, directory, filter='data')
+            elif member.isfile() and os.path.basename(member.name) == member.name:
+                archive.extract(member, directory)
+            else:
+                continue
+            extracted.append(member.name)
+    return extracted
 
 
-def exec_command(request: str, address: tuple) -> dict | None:
+def exec_command(request: str, address: tuple, payload=None, sink=None) -> dict | None:
     """
     Kirim perintah ke server dan terima respons JSON.
+    payload (bytes atau file biner) dikirim apa adanya setelah request.
     """
     try:
         connection = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         connection.connect(address)
         connection.sendall(request.encode())
+        if isinstance(payload, (bytes, bytearray, memoryview)):
+            connection.sendall(payload)
+        elif payload is not None:
+            connection.sendfile(payload)
 
-        buffer = ""
-        while True:
-            chunk = connection.recv(MAX_PACKET)
-            if not chunk:
-                break
-            buffer += chunk.decode()
-            if "\r\n\r\n" in buffer:
-                break
+        # Header JSON selalu satu baris yang diakhiri "\r\n\r\n"
+        stream = connection.makefile('rb')
+        header = stream.readline()
+        resp = json.loads(header)
+        if resp.get('data_framing'):
+            stream.readline()
+            read_body(stream, resp, sink)
 
+        stream.close()
         connection.close()
-        return json.loads(buffer)
+        return resp
     except Exception as e:
         logging.error(f"Execution error: {e}")
         return None
@@ -41,23 +130,179 @@ def list_remote(address: tuple) -> None:
         print("Gagal mengambil daftar berkas.")
 
 
-def download_remote(filename: str, address: tuple) -> None:
-    resp = exec_command(f"GET {filename}\r\n\r\n", address)
+def download_remote(filename: str, address: tuple, binary: bool = False, retries: int = 3,
+                    compress: str | None = None) -> None:
+    """
+    Unduh berkas ke '<nama>.part' lalu rename setelah lengkap. Jika koneksi
+    putus, unduhan dilanjutkan dari ukuran .part (juga antar pemanggilan).
+    Mode base64 meminta per segmen sehingga kegagalan hanya mengulang satu segmen.
+    compress (zlib/lzma) meminta server mengompres transfer jika isinya layak.
+    """
+    option = f" compress={compress}" if compress else ""
+    part_name = f"{filename}.part"
+    offset = os.path.getsize(part_name) if os.path.exists(part_name) else 0
+    total = None
+    failures = 0
+    while True:
+        with open(part_name, 'ab') as out:
+            if binary:
+                resp = exec_command(f"GETRAW {filename} {offset}{option}\r\n\r\n", address, sink=out)
+            else:
+                resp = exec_command(f"GET {filename} {offset} {RESUME_SEGMENT}{option}\r\n\r\n", address)
+                if resp and resp.get('status') == 'OK':
+                    out.write(decode_file(resp))
+
+        if resp and resp.get('status') != 'OK':
+            if os.path.getsize(part_name) == 0:
+                os.remove(part_name)
+            print(f"Gagal mengunduh '{filename}': {resp.get('data')}")
+            return
+        if resp and total is not None and resp['data_size'] != total:
+            # Berkas di server berubah di tengah unduhan; mulai ulang dari awal
+            logging.warning(f"Ukuran '{filename}' berubah di server, unduhan diulang")
+            os.remove(part_name)
+            offset, total = 0, None
+            continue
+        if resp:
+            total = resp['data_size']
+
+        new_offset = os.path.getsize(part_name)
+        if total is not None and new_offset >= total:
+            os.replace(part_name, filename)
+            print(f"Berkas '{filename}' berhasil diunduh ({total} byte).")
+            return
+
+        failures = 0 if new_offset > offset else failures + 1
+        if failures > retries:
+            print(f"Gagal mengunduh '{filename}', {new_offset} byte tersimpan di '{part_name}' untuk dilanjutkan.")
+            return
+        if not resp:
+            logging.warning(f"Koneksi terputus, melanjutkan '{filename}' dari byte {new_offset}")
+        offset = new_offset
+
+
+class OffsetWriter:
+    # Sink untuk read_body yang menulis ke posisi tertentu di file tanpa berbagi posisi seek antar thread
+    def __init__(self, fd: int, offset: int):
+        self.fd = fd
+        self.offset = offset
+
+    def write(self, data: bytes) -> None:
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(self.fd, view, self.offset)
+            self.offset += written
+            view = view[written:]
+
+
+def fetch_segment(filename: str, address: tuple, fd: int, start: int, end: int,
+                  binary: bool = True, retries: int = 3) -> int:
+    writer = OffsetWriter(fd, start)
+    failures = 0
+    while writer.offset < end:
+        before = writer.offset
+        length = end - writer.offset
+        if binary:
+            resp = exec_command(f"GETRAW {filename} {writer.offset} {length}\r\n\r\n", address, sink=writer)
+        else:
+            resp = exec_command(f"GET {filename} {writer.offset} {min(length, RESUME_SEGMENT)}\r\n\r\n", address)
+            if resp and resp.get('status') == 'OK':
+                writer.write(base64.b64decode(resp['data_file']))
+        if resp and resp.get('status') != 'OK':
+            raise RuntimeError(resp.get('data'))
+        failures = 0 if writer.offset > before else failures + 1
+        if failures > retries:
+            raise ConnectionError(f"segmen {start}-{end} gagal pada byte {writer.offset}")
+    return end - start
+
+
+def download_parallel(filename: str, address: tuple, segments: int = 4, binary: bool = True) -> None:
+    """
+    Bagi berkas menjadi beberapa range byte dan unduh lewat beberapa koneksi
+    sekaligus; tiap segmen ditulis langsung ke offset-nya di file yang sudah
+    dialokasikan sebelumnya.
+    """
+    probe = exec_command(f"GETRAW {filename} 0 0\r\n\r\n", address)
+    if not probe or probe.get('status') != 'OK':
+        print(f"Gagal mengunduh '{filename}'.")
+        return
+    size = probe['data_size']
+    segments = max(segments, 1)
+    segment_size = -(-size // segments) if size else 0
+    ranges = [(start, min(start + segment_size, size)) for start in range(0, size, segment_size or 1)]
+
+    part_name = f"{filename}.part"
+    start_time = time.time()
+    with open(part_name, 'wb') as out:
+        out.truncate(size)
+        try:
+            with ThreadPoolExecutor(max_workers=max(len(ranges), 1)) as executor:
+                futures = [executor.submit(fetch_segment, filename, address, out.fileno(), start, end, binary)
+                           for start, end in ranges]
+                received = sum(f.result() for f in futures)
+        except Exception as e:
+            print(f"Gagal mengunduh '{filename}': {e}")
+            return
+    os.replace(part_name, filename)
+
+    duration = time.time() - start_time
+    throughput = received / duration if duration > 0 else 0
+    print(f"Berkas '{filename}' ({received} byte) diunduh dengan {len(ranges)} koneksi "
+          f"dalam {duration:.3f} s, throughput {throughput / (1024 * 1024):.2f} MB/s.")
+
+
+def download_many(patterns: list, address: tuple, directory: str = '.') -> None:
+    resp = exec_command(f"MGET {' '.join(patterns)}\r\n\r\n", address, sink=directory)
     if resp and resp.get('status') == 'OK':
-        encoded = resp['data_file']
-        local_name = resp.get('data_namafile', filename)
-        with open(local_name, 'wb') as out:
-            out.write(base64.b64decode(encoded))
-        print(f"Berkas '{filename}' berhasil diunduh sebagai '{local_name}'.")
+        for name in resp['data_extracted']:
+            print(f"- {name}")
+        for name in resp['data_missing']:
+            print(f"- {name} (tidak ditemukan)")
+        print(f"{len(resp['data_extracted'])} berkas berhasil diunduh ke '{directory}'.")
     else:
-        print(f"Gagal mengunduh '{filename}'.")
+        print("Gagal mengunduh berkas.")
+
 
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        while chunk := file.read(MAX_PACKET):
+            digest.update(chunk)
+    return digest.hexdigest()
 
-def upload_remote(path: str, address: tuple) -> None:
+
+def upload_remote(path: str, address: tuple, binary: bool = False, dedup: bool = False,
+                  compress: str | None = None) -> None:
     try:
-        with open(path, 'rb') as file:
-            data_b64 = base64.b64encode(file.read()).decode()
-        resp = exec_command(f"POST {path} {data_b64}\r\n\r\n", address)
+        if dedup:
+            # Kirim hash dulu; jika server sudah punya isinya, upload dilewati
+            resp = exec_command(f"POSTHASH {path} {file_sha256(path)}\r\n\r\n", address)
+            if resp and resp.get('status') == 'OK' and resp.get('data_found'):
+                print(f"File '{path}' sudah ada di server, upload dilewati.")
+                return
+        if compress:
+            with open(path, 'rb') as file:
+                compress = choose_codec(path, compress, file.read(SAMPLE_SIZE))
+        option = f" compress={compress}" if compress else ""
+        if binary and compress:
+            # Ukuran hasil kompresi harus diketahui untuk POSTRAW, jadi dikompres per chunk ke file sementara
+            with open(path, 'rb') as file, tempfile.TemporaryFile() as packed:
+                for chunk in compress_chunks(iter(lambda: file.read(MAX_PACKET), b''), compress):
+                    packed.write(chunk)
+                size = packed.tell()
+                packed.seek(0)
+                resp = exec_command(f"POSTRAW {path} {size}{option}\r\n\r\n", address, payload=packed)
+        elif binary:
+            with open(path, 'rb') as file:
+                size = os.fstat(file.fileno()).st_size
+                resp = exec_command(f"POSTRAW {path} {size}\r\n\r\n", address, payload=file)
+        else:
+            with open(path, 'rb') as file:
+                data = file.read()
+            if compress:
+                data = b''.join(compress_chunks([data], compress))
+            data_b64 = base64.b64encode(data).decode()
+            resp = exec_command(f"POST {path}{option} {data_b64}\r\n\r\n", address)
         if resp and resp.get('status') == 'OK':
             print(f"File '{path}' berhasil diunggah.")
         else:
@@ -66,11 +311,49 @@ def upload_remote(path: str, address: tuple) -> None:
         print(f"File '{path}' tidak ditemukan.")
 
 
+def sync_remote(path: str, address: tuple, block_size: int = BLOCK_SIZE) -> None:
+    """
+    Perbarui berkas yang sudah ada di server dengan hanya mengirim bagian
+    yang berubah: ambil signature blok dari server, lalu kirim referensi
+    blok yang sama dan literal untuk sisanya.
+    """
+    sig = exec_command(f"SIGNATURE {path} {block_size}\r\n\r\n", address)
+    if not sig or sig.get('status') != 'OK':
+        print(f"'{path}' belum ada di server, mengunggah seluruh berkas.")
+        upload_remote(path, address, binary=True)
+        return
+
+    try:
+        with open(path, 'rb') as file, tempfile.TemporaryFile() as delta:
+            size = os.fstat(file.fileno()).st_size
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+            reused = 0
+            for op, value in compute_delta(data, sig['weak'], sig['strong'], sig['block_size']):
+                reused += op == 'block'
+                delta.write(encode_op(op, value))
+            length = delta.tell()
+            delta.seek(0)
+            request = f"DELTA {path} {sig['block_size']} {length} {file_sha256(path)}\r\n\r\n"
+            resp = exec_command(request, address, payload=delta)
+    except FileNotFoundError:
+        print(f"File '{path}' tidak ditemukan.")
+        return
+
+    if resp and resp.get('status') == 'OK':
+        print(f"File '{path}' tersinkron: {length} byte dikirim untuk berkas {size} byte "
+              f"({reused} blok dipakai ulang).")
+    else:
+        print(f"Gagal sinkronisasi '{path}': {resp.get('data') if resp else 'koneksi gagal'}")
+
+
 def main() -> None:
     host = input("Server host (default: localhost): ").strip() or 'localhost'
     port_input = input("Server port (default: 6666): ").strip()
     port_num = int(port_input) if port_input.isdigit() else 6666
     endpoint = (host, port_num)
+    binary = input("Gunakan mode biner untuk unduh/unggah? [y/N]: ").strip().lower() == 'y'
+    dedup = input("Kirim hash sebelum unggah (lewati jika server sudah punya)? [y/N]: ").strip().lower() == 'y'
+    compress = input("Kompresi unduh/unggah (zlib/lzma, kosong = tanpa kompresi): ").strip().lower() or None
 
     active = True
     while active:
@@ -78,20 +361,36 @@ def main() -> None:
         print("1. Tampilkan daftar berkas")
         print("2. Unduh berkas")
         print("3. Unggah berkas")
-        print("4. Keluar")
-        choice = input("Pilih [1-4]: ").strip()
+        print("4. Unduh berkas paralel (beberapa koneksi)")
+        print("5. Unduh banyak berkas sekaligus (nama atau pola, mis. *.jpg)")
+        print("6. Sinkronisasi berkas yang sudah ada (delta)")
+        print("7. Keluar")
+        choice = input("Pilih [1-7]: ").strip()
 
         if choice == '1':
             list_remote(endpoint)
         elif choice == '2':
             fname = input("Nama berkas untuk diunduh: ").strip()
             if fname:
-                download_remote(fname, endpoint)
+                download_remote(fname, endpoint, binary, compress=compress)
         elif choice == '3':
             fname = input("Nama berkas untuk diunggah: ").strip()
             if fname:
-                upload_remote(fname, endpoint)
+                upload_remote(fname, endpoint, binary, dedup, compress)
         elif choice == '4':
+            fname = input("Nama berkas untuk diunduh: ").strip()
+            jumlah = input("Jumlah koneksi (default: 4): ").strip()
+            if fname:
+                download_parallel(fname, endpoint, int(jumlah) if jumlah.isdigit() else 4, binary)
+        elif choice == '5':
+            patterns = input("Nama berkas/pola, pisahkan dengan spasi: ").split()
+            if patterns:
+                download_many(patterns, endpoint)
+        elif choice == '6':
+            fname = input("Nama berkas untuk disinkronkan: ").strip()
+            if fname:
+                sync_remote(fname, endpoint)
+        elif choice == '7':
             active = False
         else:
             print("Pilihan tidak valid.")
@@ -0,0 +1,158 @@
+import os
+import lzma
+import time
+import zlib
+import threading
+
+CODECS = ('zlib', 'lzma')
+# Format yang isinya sudah terkompresi; mengompres ulang hanya membuang CPU
+COMPRESSED_EXTENSIONS = {
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.mp3', '.mp4', '.mkv', '.avi', '.mov',
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.lzma', '.7z', '.rar', '.zst', '.docx', '.xlsx', '.pptx',
+}
+SAMPLE_SIZE = 64 * 1024
+# Jika sampel hanya mengecil kurang dari ini, isi file dianggap tidak bisa dikompres
+SAMPLE_MIN_SAVING = 0.05
+# Batas output satu langkah dekompresi, supaya data kecil yang mengembang sangat besar tidak dimuat utuh
+DECOMPRESS_LIMIT = 1024 * 1024
+
+
+def should_compress(filename, sample=None):
+    # Heuristik: lewati ekstensi yang sudah terkompresi, lalu uji cepat sampel awal dengan zlib level 1
+    if os.path.splitext(filename)[1].lower() in COMPRESSED_EXTENSIONS:
+        return False
+    if sample:
+        return len(zlib.compress(sample, 1)) <= len(sample) * (1 - SAMPLE_MIN_SAVING)
+    return True
+
+
+def choose_codec(filename, requested, sample=None):
+    # Codec yang benar-benar dipakai untuk transfer ini, atau None jika dikirim apa adanya
+    if requested not in CODECS or not should_compress(filename, sample):
+        return None
+    return requested
+
+
+def compressor(codec):
+    if codec == 'zlib':
+        return zlib.compressobj(6)
+    if codec == 'lzma':
+        return lzma.LZMACompressor()
+    raise ValueError(f'kompresi tidak dikenal: {codec}')
+
+
+def decompressor(codec):
+    if codec == 'zlib':
+        return zlib.decompressobj()
+    if codec == 'lzma':
+        return lzma.LZMADecompressor()
+    raise ValueError(f'kompresi tidak dikenal: {codec}')
+
+
+def decompress_chunks(decomp, data, limit=DECOMPRESS_LIMIT):
+    # Hasil dekompresi per potongan maksimal limit byte; tiap potongan harus dipakai sebelum yang berikutnya dibuat
+    while True:
+        out = decomp.decompress(data, limit)
+        if out:
+            yield out
+        if isinstance(decomp, lzma.LZMADecompressor):
+            if decomp.needs_input or decomp.eof:
+                return
+            data = b''
+        else:
+            # zlib: input yang belum diproses ada di unconsumed_tail; output yang pas limit berarti mungkin masih ada sisa
+            data = decomp.unconsumed_tail
+            if not data and len(out) < limit:
+                return
+
+
+class CompressionStats:
+    # Total byte asli vs byte di jaringan dan waktu CPU (per thread) yang dipakai kompres/dekompres
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.transfers = 0
+        self.skipped = 0
+        self.raw_bytes = 0
+        self.wire_bytes = 0
+        self.cpu_time = 0.0
+
+    def record(self, raw, wire, cpu):
+        with self.lock:
+            self.raw_bytes += raw
+            self.wire_bytes += wire
+            self.cpu_time += cpu
+
+    def count(self, compressed):
+        with self.lock:
+            if compressed:
+                self.transfers += 1
+            else:
+                self.skipped += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                'transfers': self.transfers,
+                'skipped': self.skipped,
+                'raw_bytes': self.raw_bytes,
+                'wire_bytes': self.wire_bytes,
+                'ratio': round(self.wire_bytes / self.raw_bytes, 4) if self.raw_bytes else None,
+                'cpu_seconds': round(self.cpu_time, 6),
+            }
+
+
+def compress_chunks(chunks, codec, stats=None):
+    # Kompres per chunk; output yang kosong (masih ditahan compressor) tidak di-yield
+    comp = compressor(codec)
+    for chunk in chunks:
+        start = time.thread_time()
+        out = comp.compress(chunk)
+        if stats is not None:
+            stats.record(len(chunk), len(out), time.thread_time() - start)
+        if out:
+            yield out
+    start = time.thread_time()
+    out = comp.flush()
+    if stats is not None:
+        stats.record(0, len(out), time.thread_time() - start)
+    if out:
+        yield out
+
+
+class DecompressingUpload:
+    # Membungkus FileUpload: data terkompresi dari client di-dekompres bertahap sebelum ditulis
+    def __init__(self, upload, codec, stats=None):
+        self.upload = upload
+        self.decomp = decompressor(codec)
+        self.stats = stats
+
+    @property
+    def filename(self):
+        return self.upload.filename
+
+    @property
+    def size(self):
+        return self.upload.size
+
+    def write(self, data):
+        pieces = decompress_chunks(self.decomp, data)
+        raw = 0
+        cpu = 0.0
+        while True:
+            start = time.thread_time()
+            out = next(pieces, None)
+            cpu += time.thread_time() - start
+            if out is None:
+                break
+            raw += len(out)
+            self.upload.write(out)
+        if self.stats is not None:
+            self.stats.record(raw, len(data), cpu)
+
+    def commit(self):
+        if not self.decomp.eof:
+            raise ValueError('data terkompresi terpotong')
+        self.upload.commit()
+
+    def abort(self):
+        self.upload.abort()
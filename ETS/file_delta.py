@@ -0,0 +1,124 @@
+import hashlib
+from itertools import accumulate
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+BLOCK_SIZE = 8 * 1024
+# Jumlah posisi yang checksum rolling-nya dihitung sekaligus di sisi client
+WINDOW_SIZE = 16 * 1024 * 1024
+LITERAL_CHUNK = 1024 * 1024
+
+OP_BLOCK = b'B'
+OP_LITERAL = b'L'
+
+
+def strong_checksum(block):
+    return hashlib.blake2b(block, digest_size=16).hexdigest()
+
+
+def weak_checksum(block):
+    # Checksum gaya rsync: a = jumlah byte, b = jumlah berbobot (L - i) * x_i, keduanya mod 2^16
+    a = sum(block)
+    b = sum(accumulate(block))
+    return (a & 0xffff) | ((b & 0xffff) << 16)
+
+
+def block_signatures(f, block_size=BLOCK_SIZE):
+    # Signature blok penuh yang tidak saling tumpang tindih; sisa di ujung file dikirim client sebagai literal
+    weak, strong = [], []
+    batch = max(1, WINDOW_SIZE // block_size)
+    while True:
+        data = f.read(block_size * batch)
+        count = len(data) // block_size
+        if count == 0:
+            break
+        if np is not None:
+            x = np.frombuffer(data, dtype=np.uint8, count=count * block_size).reshape(count, block_size).astype(np.int64)
+            a = x.sum(axis=1)
+            b = x @ np.arange(block_size, 0, -1, dtype=np.int64)
+            weak.extend(((a & 0xffff) | ((b & 0xffff) << 16)).tolist())
+        else:
+            weak.extend(weak_checksum(data[i * block_size:(i + 1) * block_size]) for i in range(count))
+        strong.extend(strong_checksum(data[i * block_size:(i + 1) * block_size]) for i in range(count))
+        if len(data) < block_size * batch:
+            break
+    return weak, strong
+
+
+def rolling_checksums(data, block_size):
+    # Checksum lemah untuk setiap offset 0..len(data)-block_size
+    count = len(data) - block_size + 1
+    if count <= 0:
+        return []
+    if np is not None:
+        x = np.frombuffer(data, dtype=np.uint8).astype(np.int64)
+        s = np.concatenate(([0], np.cumsum(x)))
+        t = np.concatenate(([0], np.cumsum(x * np.arange(len(x), dtype=np.int64))))
+        k = np.arange(count, dtype=np.int64)
+        a = s[k + block_size] - s[k]
+        b = (k + block_size) * a - (t[k + block_size] - t[k])
+        return (a & 0xffff) | ((b & 0xffff) << 16)
+
+    result = []
+    a = sum(data[:block_size])
+    b = sum(accumulate(data[:block_size]))
+    result.append((a & 0xffff) | ((b & 0xffff) << 16))
+    for k in range(1, count):
+        out, into = data[k - 1], data[k + block_size - 1]
+        a += into - out
+        b += a - block_size * out
+        result.append((a & 0xffff) | ((b & 0xffff) << 16))
+    return result
+
+
+def compute_delta(data, weak, strong, block_size=BLOCK_SIZE):
+    """
+    Bandingkan data lokal dengan signature blok dari server dan hasilkan
+    operasi ('block', index) untuk blok yang sudah ada di server serta
+    ('literal', bytes) untuk sisanya.
+    """
+    lookup = {}
+    for index, value in enumerate(weak):
+        lookup.setdefault(value, []).append(index)
+
+    n = len(data)
+    p = 0
+    literal_start = 0
+    while p + block_size <= n:
+        window_start = p
+        window_end = min(p + WINDOW_SIZE, n - block_size + 1)
+        sums = rolling_checksums(data[window_start:window_end + block_size - 1], block_size)
+        for c in _candidates(sums, lookup):
+            q = window_start + c
+            if q < p:
+                continue
+            digest = strong_checksum(data[q:q + block_size])
+            match = next((i for i in lookup[int(sums[c])] if strong[i] == digest), None)
+            if match is not None:
+                yield from _literals(data, literal_start, q)
+                yield 'block', match
+                p = q + block_size
+                literal_start = p
+        p = max(p, window_end)
+    yield from _literals(data, literal_start, n)
+
+
+def _candidates(sums, lookup):
+    # Offset yang checksum lemahnya cocok dengan salah satu blok server; hanya ini yang perlu dicek hash kuatnya
+    if np is not None:
+        return np.flatnonzero(np.isin(sums, np.fromiter(lookup, dtype=np.int64, count=len(lookup)))).tolist()
+    return [i for i, value in enumerate(sums) if value in lookup]
+
+
+def _literals(data, start, end):
+    for i in range(start, end, LITERAL_CHUNK):
+        yield 'literal', bytes(data[i:min(i + LITERAL_CHUNK, end)])
+
+
+def encode_op(op, value):
+    if op == 'block':
+        return OP_BLOCK + value.to_bytes(4, 'big')
+    return OP_LITERAL + len(value).to_bytes(4, 'big') + value
@@ -0,0 +1,149 @@
+import os
+import bisect
+import hashlib
+import sqlite3
+import threading
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(filename):
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FileIndex:
+    """
+    Index metadata file (nama, size, mtime, sha256) yang diperbarui oleh
+    post/delete, sehingga LIST tidak perlu glob seluruh direktori.
+    Nama disimpan terurut agar filter prefix dan paginasi cukup O(hasil).
+    Jika db_path diberikan, index disimpan di SQLite dan hash file yang
+    tidak berubah tidak perlu dihitung ulang saat server restart.
+    """
+    def __init__(self, directory='.', db_path=None):
+        self.directory = directory
+        self.lock = threading.Lock()
+        # Hanya satu sync berjalan; LIST lain yang melihat index basi menunggu hasilnya, bukan ikut scan
+        self.sync_lock = threading.Lock()
+        self.names = []
+        self.meta = {}
+        self.dir_mtime = None
+        self.db_path = db_path
+        self.db_pid = None
+        self._db = None
+        if self.db is not None:
+            self.db.execute(
+                'CREATE TABLE IF NOT EXISTS files '
+                '(name TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, hash TEXT)'
+            )
+            for name, size, mtime_ns, digest in self.db.execute('SELECT name, size, mtime_ns, hash FROM files'):
+                self.meta[name] = {'size': size, 'mtime_ns': mtime_ns, 'hash': digest}
+            self.names = sorted(self.meta)
+        self.sync()
+
+    @property
+    def db(self):
+        # Koneksi SQLite tidak boleh dipakai bersama setelah fork, jadi tiap proses worker membuka koneksinya sendiri
+        if self.db_path is None:
+            return None
+        if self.db_pid != os.getpid():
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.db_pid = os.getpid()
+        return self._db
+
+    @staticmethod
+    def indexed(name):
+        # File tersembunyi (temp upload, database index) tidak ikut dilayani
+        return not name.startswith('.')
+
+    def sync(self):
+        # Cocokkan index dengan isi direktori; hash hanya dihitung ulang untuk file yang size/mtime-nya berubah.
+        # Scan dan hash berjalan tanpa lock; hasilnya hanya diterapkan ke entri yang tidak diubah
+        # update()/remove() selama scan (dibandingkan dengan snapshot meta di awal)
+        dir_mtime = os.stat(self.directory).st_mtime_ns
+        with self.lock:
+            before = dict(self.meta)
+        seen = set()
+        changed = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not self.indexed(entry.name) or not entry.is_file():
+                    continue
+                seen.add(entry.name)
+                st = entry.stat()
+                old = before.get(entry.name)
+                if old and old['size'] == st.st_size and old['mtime_ns'] == st.st_mtime_ns:
+                    continue
+                try:
+                    changed.append((entry.name, st.st_size, st.st_mtime_ns, file_digest(entry.path)))
+                except FileNotFoundError:
+                    seen.discard(entry.name)
+        with self.lock:
+            for name, size, mtime_ns, digest in changed:
+                if self.meta.get(name) is before.get(name):
+                    self._put(name, size, mtime_ns, digest)
+            for name, old in before.items():
+                if name not in seen and self.meta.get(name) is old:
+                    self._remove(name)
+            if self.db is not None:
+                self.db.commit()
+            self.dir_mtime = dir_mtime
+
+    def refresh(self):
+        # Perubahan dari proses lain (mis. worker mp_server lain) terlihat dari mtime direktori
+        if os.stat(self.directory).st_mtime_ns != self.dir_mtime:
+            with self.sync_lock:
+                if os.stat(self.directory).st_mtime_ns != self.dir_mtime:
+                    self.sync()
+
+    def update(self, name, size, mtime_ns, digest):
+        with self.lock:
+            self._put(name, size, mtime_ns, digest)
+            if self.db is not None:
+                self.db.commit()
+            self.dir_mtime = os.stat(self.directory).st_mtime_ns
+
+    def remove(self, name):
+        with self.lock:
+            self._remove(name)
+            if self.db is not None:
+                self.db.commit()
+            self.dir_mtime = os.stat(self.directory).st_mtime_ns
+
+    def _put(self, name, size, mtime_ns, digest):
+        if name not in self.meta:
+            bisect.insort(self.names, name)
+        self.meta[name] = {'size': size, 'mtime_ns': mtime_ns, 'hash': digest}
+        if self.db is not None:
+            self.db.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)', (name, size, mtime_ns, digest))
+
+    def _remove(self, name):
+        if self.meta.pop(name, None) is None:
+            return
+        del self.names[bisect.bisect_left(self.names, name)]
+        if self.db is not None:
+            self.db.execute('DELETE FROM files WHERE name = ?', (name,))
+
+    def get(self, name):
+        with self.lock:
+            return self.meta.get(name)
+
+    def list(self, prefix='', after='', limit=None):
+        self.refresh()
+        with self.lock:
+            start = bisect.bisect_left(self.names, max(prefix, after))
+            if after and start < len(self.names) and self.names[start] == after:
+                start += 1
+            result = []
+            for i in range(start, len(self.names)):
+                name = self.names[i]
+                if not name.startswith(prefix):
+                    break
+                if limit is not None and len(result) >= limit:
+                    return result, result[-1]['name']
+                meta = self.meta[name]
+                result.append({'name': name, 'size': meta['size'], 'mtime': meta['mtime_ns'] / 1e9, 'hash': meta['hash']})
+            return result, None
@@ -1,16 +1,177 @@
 import os
+import re
 import json
 import base64
-from glob import glob
+import binascii
+import hashlib
+import tempfile
+import fnmatch
+import threading
+from collections import OrderedDict
+from file_index import FileIndex
+from file_delta import BLOCK_SIZE, block_signatures
+
+CACHE_BUDGET = 256 * 1024 * 1024
+INDEX_DB = '.index.sqlite3'
+BLOB_DIR = '.blobs'
+# Temp file upload/link dibuat di subdirektori supaya mtime direktori files (tanda index basi) hanya berubah saat commit/delete
+TEMP_DIR = '.tmp'
+
+
+class ContentCache:
+    # LRU berbasis jumlah byte untuk payload base64; key (nama, size, mtime_ns) sehingga file yang berubah otomatis miss
+    def __init__(self, budget=CACHE_BUDGET):
+        self.budget = budget
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def fits(self, size):
+        return size <= self.budget
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if not self.fits(len(value)):
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self.entries[key] = value
+            self.size += len(value)
+            self._evict()
+
+    def invalidate(self, filename):
+        with self.lock:
+            for key in [k for k in self.entries if k[0] == filename]:
+                self.size -= len(self.entries.pop(key))
+
+    def set_budget(self, budget):
+        with self.lock:
+            self.budget = budget
+            self._evict()
+
+    def _evict(self):
+        while self.size > self.budget and self.entries:
+            _, value = self.entries.popitem(last=False)
+            self.size -= len(value)
+            self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'size': self.size,
+                'budget': self.budget,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+class SingleFlight:
+    # Pemanggilan dengan key yang sama yang berjalan bersamaan berbagi satu hasil (satu kali baca+encode)
+    class Call:
+        def __init__(self):
+            self.event = threading.Event()
+            self.result = None
+            self.error = None
 
-class FileInterface:
     def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = SingleFlight.Call()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.event.set()
+        return call.result
+
+    def stats(self):
+        with self.lock:
+            return {'inflight': len(self.calls), 'leaders': self.leaders, 'coalesced': self.coalesced}
+
+
+class FileUpload:
+    # File ditulis ke temp file lalu di-rename agar pembaca tidak melihat file setengah jadi
+    def __init__(self, filename, interface=None):
+        self.filename = filename
+        self.interface = interface
+        fd, self.temp_name = tempfile.mkstemp(prefix='.upload-', dir=TEMP_DIR)
+        os.fchmod(fd, 0o644)
+        self.file = os.fdopen(fd, 'wb')
+        self.size = 0
+        self.digest = hashlib.sha256()
+
+    def write(self, data):
+        self.file.write(data)
+        self.digest.update(data)
+        self.size += len(data)
+
+    def commit(self):
+        self.file.close()
+        if self.interface is None:
+            os.replace(self.temp_name, self.filename)
+            return
+        self.interface.store(self.temp_name, self.filename, self.digest.hexdigest())
+
+    def abort(self):
+        self.file.close()
+        if os.path.exists(self.temp_name):
+            os.remove(self.temp_name)
+
+
+class FileInterface:
+    def __init__(self, cache_budget=CACHE_BUDGET, index_db=INDEX_DB, dedup=False):
         os.chdir('files/')
+        os.makedirs(TEMP_DIR, exist_ok=True)
+        self.dedup = dedup
+        self.cache = ContentCache(cache_budget)
+        self.flight = SingleFlight()
+        self.index = FileIndex('.', index_db)
 
     def list(self, params=[]):
         try:
-            file_list = glob('*.*')
-            return {'status': 'OK', 'data': file_list}
+            # Parameter opsional berbentuk key=value: prefix=, after= (cursor), limit=
+            options = dict(p.split('=', 1) for p in params if '=' in p)
+            limit = int(options['limit']) if 'limit' in options else None
+            files, cursor = self.index.list(options.get('prefix', ''), options.get('after', ''), limit)
+            return {'status': 'OK', 'data': [f['name'] for f in files], 'files': files, 'next': cursor}
         except Exception as e:
             return {'status': 'ERROR', 'data': str(e)}
 
@@ -19,8 +180,12 @@ class FileInterface:
             filename = params[0]
             if filename == '':
                 return None
-            with open(f"{filename}", 'rb') as f:
-                file_data = base64.b64encode(f.read()).decode()
+            encoded = self.get_encoded(filename)
+            if encoded is not None:
+                file_data = encoded.decode()
+            else:
+                with open(f"{filename}", 'rb') as f:
+                    file_data = base64.b64encode(f.read()).decode()
             return {'status': 'OK', 'data_namafile': filename, 'data_file': file_data}
         except Exception as e:
             return {'status': 'ERROR', 'data': str(e)}
@@ -29,17 +194,159 @@ class FileInterface:
         try:
             filename = params[0]
             file_data = params[1]
-            decoded = base64.b64decode(file_data.encode())
-            with open(filename, 'wb') as f:
-                f.write(decoded)
-            return {'status': 'OK', 'data_namafile': filename, 'data_file': file_data}
+            upload = self.open_upload(filename)
+            # file_data bisa str atau memoryview dari split_request; a2b_base64 menerima keduanya tanpa salinan
+            upload.write(binascii.a2b_base64(file_data))
+            upload.commit()
+            return {'status': 'OK', 'data_namafile': filename, 'data_length': upload.size}
         except Exception as e:
             return {'status': 'ERROR', 'data': str(e)}
 
     def delete(self, params=[]):
         try:
             filename = params[0]
+            old = self.index.get(filename)
             os.remove(filename)
+            self.cache.invalidate(filename)
+            self.index.remove(filename)
+            if old:
+                self.release_blob(old['hash'])
             return {'status': 'OK', 'data_filename': filename}
         except Exception as e:
             return {'status': 'ERROR', 'data': str(e)}
+
+    def get_encoded(self, filename):
+        # Payload base64 dari cache; None jika file terlalu besar untuk budget cache (pemanggil harus streaming)
+        st = os.stat(filename)
+        key = (filename, st.st_size, st.st_mtime_ns)
+        encoded = self.cache.get(key)
+        if encoded is not None:
+            return encoded
+        if not self.cache.fits((st.st_size + 2) // 3 * 4):
+            return None
+        return self.flight.do(key, lambda: self._load_encoded(filename, key))
+
+    def _load_encoded(self, filename, key):
+        with open(filename, 'rb') as f:
+            encoded = base64.b64encode(f.read())
+        self.cache.put(key, encoded)
+        return encoded
+
+    def match(self, patterns):
+        # Nama biasa dipakai apa adanya; pola glob dicocokkan ke index mulai dari prefix literalnya
+        names = []
+        for pattern in patterns:
+            if not any(c in pattern for c in '*?['):
+                names.append(pattern)
+                continue
+            prefix = re.split(r'[*?\[]', pattern, 1)[0]
+            files, _ = self.index.list(prefix)
+            names.extend(f['name'] for f in files if fnmatch.fnmatchcase(f['name'], pattern))
+        return list(dict.fromkeys(names))
+
+    def posthash(self, params=[]):
+        # Jika blob dengan hash ini sudah ada, nama langsung ditautkan tanpa perlu upload isi file
+        try:
+            filename = params[0]
+            digest = params[1].lower()
+            blob = os.path.join(BLOB_DIR, digest)
+            if not self.dedup or not re.fullmatch(r'[0-9a-f]{64}', digest) or not os.path.isfile(blob):
+                return {'status': 'OK', 'data_namafile': filename, 'data_found': False}
+            old = self.index.get(filename)
+            self._link_blob(blob, filename)
+            if old and old['hash'] != digest:
+                self.release_blob(old['hash'])
+            self.committed(filename, digest)
+            return {'status': 'OK', 'data_namafile': filename, 'data_found': True}
+        except Exception as e:
+            return {'status': 'ERROR', 'data': str(e)}
+
+    def signature(self, params=[]):
+        # Signature blok untuk delta sync: checksum lemah (rolling) dan kuat per blok
+        try:
+            filename = params[0]
+            block_size = int(params[1]) if len(params) > 1 else BLOCK_SIZE
+            if block_size < 64:
+                raise ValueError('ukuran blok terlalu kecil')
+            with open(filename, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                weak, strong = block_signatures(f, block_size)
+            return {
+                'status': 'OK', 'data_namafile': filename, 'data_size': size,
+                'block_size': block_size, 'weak': weak, 'strong': strong
+            }
+        except Exception as e:
+            return {'status': 'ERROR', 'data': str(e)}
+
+    def store(self, temp_name, filename, digest):
+        # Dengan dedup, nama file adalah hard link ke .blobs/<sha256>; jumlah link menjadi reference count blob
+        old = self.index.get(filename)
+        if self.dedup:
+            os.makedirs(BLOB_DIR, exist_ok=True)
+            blob = os.path.join(BLOB_DIR, digest)
+            try:
+                os.link(temp_name, blob)
+                os.replace(temp_name, filename)
+            except FileExistsError:
+                self._link_blob(blob, filename)
+                os.remove(temp_name)
+        else:
+            os.replace(temp_name, filename)
+        if old and old['hash'] != digest:
+            self.release_blob(old['hash'])
+        self.committed(filename, digest)
+
+    def _link_blob(self, blob, filename):
+        # Nama yang sudah menjadi hard link ke blob yang sama dibiarkan; link tambahan akan membuat reference count bocor
+        try:
+            if os.path.samefile(blob, filename):
+                return
+        except FileNotFoundError:
+            pass
+        fd, link_name = tempfile.mkstemp(prefix='.link-', dir=TEMP_DIR)
+        os.close(fd)
+        os.remove(link_name)
+        os.link(blob, link_name)
+        os.replace(link_name, filename)
+        # rename antar dua link ke inode yang sama tidak melakukan apa-apa di POSIX, jadi sisa link dihapus sendiri
+        if os.path.lexists(link_name):
+            os.remove(link_name)
+
+    def release_blob(self, digest):
+        blob = os.path.join(BLOB_DIR, digest)
+        try:
+            if os.stat(blob).st_nlink <= 1:
+                os.remove(blob)
+        except FileNotFoundError:
+            pass
+
+    def committed(self, filename, digest):
+        st = os.stat(filename)
+        self.cache.invalidate(filename)
+        self.index.update(filename, st.st_size, st.st_mtime_ns, digest)
+
+    def size(self, filename):
+        return os.path.getsize(filename)
+
+    def open_read(self, filename):
+        return open(filename, 'rb')
+
+    def read_chunks(self, filename, chunk_size, offset=0, length=None):
+        # File dibuka di sini (bukan di generator) supaya error langsung terlihat oleh pemanggil
+        f = open(filename, 'rb')
+        f.seek(offset)
+        return self._iter_chunks(f, chunk_size, length)
+
+    def _iter_chunks(self, f, chunk_size, length):
+        with f:
+            remaining = length
+            while remaining is None or remaining > 0:
+                chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    def open_upload(self, filename):
+        return FileUpload(filename, self)
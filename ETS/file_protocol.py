@@ -1,26 +1,627 @@
+import os
 import json
+import time
+import re
+import base64
+import binascii
+import tarfile
 import logging
-from file_interface import FileInterface
+from file_interface import FileInterface, CACHE_BUDGET
+from file_delta import OP_BLOCK, OP_LITERAL
+from buffer_pool import FrameReader, pool as buffer_pool
+from file_compress import (CompressionStats, DecompressingUpload, SAMPLE_SIZE,
+                           choose_codec, compress_chunks)
+
+TERMINATOR = b"\r\n\r\n"
+CHUNK_SIZE = 1024 * 1024
+# Kelipatan 3 supaya base64 tiap chunk bisa langsung disambung tanpa padding di tengah
+ENCODE_CHUNK_SIZE = 3 * 256 * 1024
+# Opsi key=value yang boleh muncul di header POST sebelum payload base64
+POST_OPTIONS = (b'compress=',)
+# Perintah yang argumen terakhirnya payload besar: jumlah argumen posisi sebelum opsi dan payload
+PAYLOAD_COMMANDS = {'post': 1}
+CHUNK_END = (0).to_bytes(4, 'big')
+CARRIAGE_RETURN = re.compile(rb'\r')
+
+
+def encode_response(response):
+    return json.dumps(response).encode() + TERMINATOR
+
+
+def split_options(params):
+    # Pisahkan parameter posisi dan opsi key=value (mis. compress=zlib)
+    positional = [p for p in params if '=' not in p]
+    options = dict(p.split('=', 1) for p in params if '=' in p)
+    return positional, options
+
+
+def split_request(request):
+    # Sama dengan request.strip().split(' '), kecuali untuk PAYLOAD_COMMANDS: hanya perintah, nama file
+    # dan opsi yang dipecah, sisanya menjadi parameter terakhir tanpa di-scan. request boleh str atau bytes;
+    # untuk bytes payload dikembalikan sebagai memoryview (tanpa salinan), jadi biaya parsing POST tetap
+    binary = not isinstance(request, str)
+    space = b' ' if binary else ' '
+    text = (lambda data: data.decode()) if binary else (lambda data: data)
+    start, end = 0, len(request)
+    while start < end and request[start:start + 1].isspace():
+        start += 1
+    while end > start and request[end - 1:end].isspace():
+        end -= 1
+    command_end = request.find(space, start, end)
+    if command_end < 0:
+        return text(request[start:end]).lower(), []
+    command = text(request[start:command_end]).lower()
+    if command not in PAYLOAD_COMMANDS:
+        return command, [text(p) for p in request[command_end + 1:end].split(space)]
+    options = POST_OPTIONS if binary else tuple(option.decode() for option in POST_OPTIONS)
+    params = []
+    position = command_end + 1
+    while position < end:
+        # Payload dikenali sebelum find() supaya base64-nya tidak pernah di-scan
+        if len(params) >= PAYLOAD_COMMANDS[command] and not request.startswith(options, position):
+            params.append(memoryview(request)[position:end] if binary else request[position:end])
+            break
+        token_end = request.find(space, position, end)
+        if token_end < 0:
+            token_end = end
+        params.append(text(request[position:token_end]))
+        position = token_end + 1
+    return command, params
+
+
+def aligned_chunks(chunks, multiple=3):
+    # Satukan chunk sampai panjangnya kelipatan 3 agar base64 per chunk bisa disambung
+    pending = b''
+    for chunk in chunks:
+        pending += chunk
+        cut = len(pending) - len(pending) % multiple
+        if cut:
+            yield pending[:cut]
+            pending = pending[cut:]
+    if pending:
+        yield pending
+
+
+class SendFile:
+    # Penanda di response(): server mengirim bagian file ini langsung dari file descriptor (zero-copy)
+    def __init__(self, file, offset, count):
+        self.file = file
+        self.offset = offset
+        self.count = count
+
+
+class Transfer:
+    """
+    Satu pertukaran request/response. Server cukup memanggil feed() dengan
+    body yang diterima sampai done bernilai True, lalu mengirim setiap chunk
+    dari response().
+    """
+    def __init__(self, command, response=b''):
+        self.command = command
+        self.done = True
+        self._response = response
+
+    def feed(self, data):
+        pass
+
+    def abort(self):
+        pass
+
+    def response(self):
+        yield self._response
+
+
+class RawDownload(Transfer):
+    def __init__(self, command, header, file, offset, count):
+        super().__init__(command)
+        self.header = header
+        self.file = file
+        self.offset = offset
+        self.count = count
+
+    def abort(self):
+        self.file.close()
+
+    def response(self):
+        try:
+            yield encode_response(self.header)
+            if self.count > 0:
+                yield SendFile(self.file, self.offset, self.count)
+        finally:
+            self.file.close()
+
+
+class Base64Download(Transfer):
+    # Menghasilkan JSON yang sama persis dengan json.dumps(FileInterface.get()), tetapi per chunk
+    def __init__(self, command, filename, chunks=None, encoded=None, fields=None):
+        super().__init__(command)
+        self.filename = filename
+        self.chunks = chunks
+        self.encoded = encoded
+        self.fields = fields or {}
+
+    def response(self):
+        header = json.dumps({'status': 'OK', 'data_namafile': self.filename, **self.fields})
+        yield (header[:-1] + ', "data_file": "').encode()
+        if self.encoded is not None:
+            yield self.encoded
+        else:
+            for chunk in self.chunks:
+                yield base64.b64encode(chunk)
+        yield b'"}' + TERMINATOR
+
+
+class ChunkedDownload(Transfer):
+    # Panjang data terkompresi tidak diketahui di awal, jadi dikirim per chunk: u32 panjang + isi, diakhiri panjang 0
+    def __init__(self, command, header, chunks):
+        super().__init__(command)
+        self.header = header
+        self.chunks = chunks
+
+    def abort(self):
+        self.chunks.close()
+
+    def response(self):
+        try:
+            yield encode_response(self.header)
+            for chunk in self.chunks:
+                yield len(chunk).to_bytes(4, 'big') + chunk
+            yield CHUNK_END
+        finally:
+            self.chunks.close()
+
+
+class TarDownload(Transfer):
+    # Beberapa file dikirim sebagai satu tar stream; header tar dibuat sendiri agar isi file tetap lewat sendfile
+    def __init__(self, command, header, names, open_read):
+        super().__init__(command)
+        self.header = header
+        self.names = names
+        self.open_read = open_read
+
+    def response(self):
+        yield encode_response(self.header)
+        total = 0
+        for name in self.names:
+            try:
+                f = self.open_read(name)
+            except OSError:
+                # Terhapus setelah header dikirim; lewati saja agar arsip tetap valid
+                continue
+            with f:
+                st = os.fstat(f.fileno())
+                info = tarfile.TarInfo(name)
+                info.size = st.st_size
+                info.mtime = st.st_mtime
+                info.mode = 0o644
+                block = info.tobuf(tarfile.PAX_FORMAT, 'utf-8', 'surrogateescape')
+                yield block
+                if info.size > 0:
+                    yield SendFile(f, 0, info.size)
+                padding = -info.size % tarfile.BLOCKSIZE
+                total += len(block) + info.size + padding
+                if padding:
+                    yield tarfile.NUL * padding
+        # Akhir arsip: dua blok kosong, lalu dibulatkan ke RECORDSIZE seperti tarfile
+        end = tarfile.BLOCKSIZE * 2
+        end += -(total + end) % tarfile.RECORDSIZE
+        yield tarfile.NUL * end
+
+
+class RawUpload(Transfer):
+    def __init__(self, command, upload, length):
+        super().__init__(command)
+        self.upload = upload
+        self.remaining = length
+        self.done = length == 0
+
+    def feed(self, data):
+        data = data[:self.remaining]
+        self.upload.write(data)
+        self.remaining -= len(data)
+        self.done = self.remaining == 0
+
+    def abort(self):
+        self.upload.abort()
+
+    def response(self):
+        try:
+            self.upload.commit()
+        except Exception as e:
+            self.upload.abort()
+            yield encode_response({'status': 'ERROR', 'data': str(e)})
+            return
+        yield encode_response({'status': 'OK', 'data_namafile': self.upload.filename, 'data_length': self.upload.size})
+
+
+class Base64Upload(Transfer):
+    # Payload base64 POST di-decode bertahap langsung ke temp file sampai ketemu terminator
+    def __init__(self, command, upload):
+        super().__init__(command)
+        self.upload = upload
+        self.done = False
+        self.ended = False
+        self.trailer = len(TERMINATOR)
+        self.pending = b''
+        self.error = None
+
+    def feed(self, data):
+        # data bisa memoryview ke buffer pool: dicari dan di-decode langsung, hanya sisa < 4 byte yang disalin
+        if self.ended:
+            self.trailer -= len(data)
+        else:
+            # Alfabet base64 tidak memuat '\r', jadi '\r' pertama adalah awal terminator
+            found = CARRIAGE_RETURN.search(data)
+            if found:
+                end = found.start()
+                self.ended = True
+                self.trailer -= len(data) - end
+                data = data[:end]
+            self.decode(data)
+        self.done = self.ended and self.trailer <= 0
+
+    def decode(self, data):
+        if self.error is not None:
+            return
+        try:
+            if self.pending:
+                # Lengkapi sisa feed sebelumnya menjadi satu kelompok 4 byte
+                need = 4 - len(self.pending)
+                self.pending += bytes(data[:need])
+                data = data[need:]
+                if len(self.pending) < 4 and not self.ended:
+                    return
+                self.upload.write(binascii.a2b_base64(self.pending))
+                self.pending = b''
+            cut = len(data) if self.ended else len(data) - len(data) % 4
+            if cut:
+                self.upload.write(binascii.a2b_base64(data[:cut]))
+            self.pending = bytes(data[cut:])
+        except Exception as e:
+            self.error = str(e)
+            self.upload.abort()
+
+    def abort(self):
+        self.upload.abort()
+
+    def response(self):
+        if self.error is not None:
+            yield encode_response({'status': 'ERROR', 'data': self.error})
+            return
+        try:
+            self.upload.commit()
+        except Exception as e:
+            self.upload.abort()
+            yield encode_response({'status': 'ERROR', 'data': str(e)})
+            return
+        yield encode_response({'status': 'OK', 'data_namafile': self.upload.filename, 'data_length': self.upload.size})
+
+
+class DeltaUpload(Transfer):
+    # Menyusun file baru dari blok file lama di server dan literal dari client (lihat file_delta)
+    def __init__(self, command, upload, basis, block_size, length, expected):
+        super().__init__(command)
+        self.upload = upload
+        self.basis = basis
+        self.block_size = block_size
+        self.remaining = length
+        self.expected = expected
+        self.buffer = bytearray()
+        self.literal = 0
+        self.error = None
+        self.done = length == 0
+
+    def feed(self, data):
+        data = data[:self.remaining]
+        self.remaining -= len(data)
+        self.done = self.remaining == 0
+        if self.error is not None:
+            return
+        self.buffer += data
+        try:
+            self.apply()
+        except Exception as e:
+            self.error = str(e)
+            self.upload.abort()
+            self.buffer.clear()
+
+    def apply(self):
+        while True:
+            if self.literal:
+                n = min(self.literal, len(self.buffer))
+                self.upload.write(bytes(self.buffer[:n]))
+                del self.buffer[:n]
+                self.literal -= n
+                if self.literal:
+                    return
+            if len(self.buffer) < 5:
+                return
+            op, value = bytes(self.buffer[:1]), int.from_bytes(self.buffer[1:5], 'big')
+            del self.buffer[:5]
+            if op == OP_LITERAL:
+                self.literal = value
+            elif op == OP_BLOCK:
+                self.basis.seek(value * self.block_size)
+                block = self.basis.read(self.block_size)
+                if len(block) != self.block_size:
+                    raise ValueError(f'blok {value} tidak ada di file lama')
+                self.upload.write(block)
+            else:
+                raise ValueError('operasi delta tidak dikenal')
+
+    def abort(self):
+        self.basis.close()
+        self.upload.abort()
+
+    def response(self):
+        self.basis.close()
+        if self.error is None and (self.literal or self.buffer):
+            self.error = 'data delta terpotong'
+            self.upload.abort()
+        if self.error is None and self.upload.digest.hexdigest() != self.expected:
+            self.error = 'hash hasil delta tidak cocok'
+            self.upload.abort()
+        if self.error is not None:
+            yield encode_response({'status': 'ERROR', 'data': self.error})
+            return
+        try:
+            self.upload.commit()
+        except Exception as e:
+            self.upload.abort()
+            yield encode_response({'status': 'ERROR', 'data': str(e)})
+            return
+        yield encode_response({'status': 'OK', 'data_namafile': self.upload.filename, 'data_length': self.upload.size})
+
 
 class FileProtocol:
-    def __init__(self, worker_status=None):
-        self.file = FileInterface()
+    def __init__(self, worker_status=None, cache_budget=CACHE_BUDGET, dedup=False):
+        self.file = FileInterface(cache_budget, dedup=dedup)
         self.worker_status = worker_status
+        self.compression = CompressionStats()
+        # Bagian tambahan STATUS dari server (mis. scheduler): nama -> fungsi tanpa argumen yang mengembalikan dict
+        self.status_providers = {}
 
     def process_string(self, incoming_data=''):
-        command_parts = incoming_data.strip().split(' ')
+        # incoming_data: str atau bytes (header dari serve)
         try:
-            command_request = command_parts[0].strip().lower()
-            params = [x for x in command_parts[1:]]
+            command_request, params = split_request(incoming_data)
 
             if command_request == "status":
+                # Salin dulu supaya semua angka berasal dari satu snapshot
+                stats = dict(self.worker_status) if self.worker_status else {}
                 return json.dumps({
                     "status": "OK",
-                    "success_worker": self.worker_status.get("success", 0) if self.worker_status else 0,
-                    "fail_worker": self.worker_status.get("fail", 0) if self.worker_status else 0
+                    "success_worker": stats.get("success", 0),
+                    "fail_worker": stats.get("fail", 0),
+                    "bytes_sent": stats.get("bytes_sent", 0),
+                    "bytes_received": stats.get("bytes_received", 0),
+                    "operations": {k[3:]: v for k, v in stats.items() if k.startswith('op_') and v},
+                    "cache": self.file.cache.stats(),
+                    "coalescing": self.file.flight.stats(),
+                    "compression": self.compression.stats(),
+                    "buffers": buffer_pool.stats(),
+                    **{name: provider() for name, provider in self.status_providers.items()}
                 })
 
             method = getattr(self.file, command_request)
             return json.dumps(method(params))
         except Exception:
             return json.dumps({'status': 'ERROR', 'data': 'Request not recognized'})
+
+    def begin(self, header, payload=False):
+        command_request, params = split_request(header)
+        try:
+            if command_request == 'get' and params and params[0] != '':
+                return self.get_stream(params)
+            if command_request == 'post' and payload:
+                return Base64Upload('post', self.open_upload(params[0], split_options(params)[1]))
+            if command_request == 'getraw':
+                return self.get_raw(params)
+            if command_request == 'postraw':
+                return self.post_raw(params)
+            if command_request == 'mget':
+                return self.mget(params)
+            if command_request == 'delta':
+                return self.delta(params)
+        except Exception as e:
+            return Transfer(command_request, encode_response({'status': 'ERROR', 'data': str(e)}))
+        hasil = self.process_string(header) + "\r\n\r\n"
+        return Transfer(command_request, hasil.encode())
+
+    def parse_range(self, params, size):
+        # GET/GETRAW <nama> [offset] [length]; length kosong berarti sampai akhir file
+        offset = int(params[1]) if len(params) > 1 else 0
+        length = int(params[2]) if len(params) > 2 else size - offset
+        if offset < 0 or length < 0:
+            raise ValueError('range tidak valid')
+        offset = min(offset, size)
+        return offset, min(length, size - offset)
+
+    def negotiate(self, filename, options):
+        # Codec yang dipakai untuk download ini; None jika tidak diminta atau isi file tampaknya sudah terkompresi
+        requested = options.get('compress')
+        if requested is None or requested == 'none':
+            return None
+        with self.file.open_read(filename) as f:
+            sample = f.read(SAMPLE_SIZE)
+        codec = choose_codec(filename, requested, sample)
+        self.compression.count(codec is not None)
+        return codec
+
+    def open_upload(self, filename, options):
+        upload = self.file.open_upload(filename)
+        codec = options.get('compress')
+        if codec is None or codec == 'none':
+            return upload
+        try:
+            wrapped = DecompressingUpload(upload, codec, self.compression)
+        except Exception:
+            upload.abort()
+            raise
+        self.compression.count(True)
+        return wrapped
+
+    def get_stream(self, params):
+        params, options = split_options(params)
+        filename = params[0]
+        codec = self.negotiate(filename, options)
+        if len(params) > 1 or codec is not None:
+            size = self.file.size(filename)
+            offset, length = self.parse_range(params, size)
+            fields = {'data_offset': offset, 'data_length': length, 'data_size': size} if len(params) > 1 else {}
+            chunks = self.file.read_chunks(filename, ENCODE_CHUNK_SIZE, offset, length)
+            if codec is not None:
+                fields['data_encoding'] = codec
+                chunks = aligned_chunks(compress_chunks(chunks, codec, self.compression))
+            return Base64Download('get', filename, chunks, fields=fields)
+        encoded = self.file.get_encoded(filename)
+        if encoded is not None:
+            return Base64Download('get', filename, encoded=encoded)
+        return Base64Download('get', filename, self.file.read_chunks(filename, ENCODE_CHUNK_SIZE))
+
+    def get_raw(self, params):
+        params, options = split_options(params)
+        filename = params[0]
+        codec = self.negotiate(filename, options)
+        f = self.file.open_read(filename)
+        try:
+            size = os.fstat(f.fileno()).st_size
+            offset, length = self.parse_range(params, size)
+        except Exception:
+            f.close()
+            raise
+        header = {
+            'status': 'OK', 'data_namafile': filename, 'data_framing': 'length',
+            'data_length': length, 'data_offset': offset, 'data_size': size
+        }
+        if codec is not None:
+            f.close()
+            header.update({'data_framing': 'chunked', 'data_encoding': codec})
+            chunks = self.file.read_chunks(filename, CHUNK_SIZE, offset, length)
+            return ChunkedDownload('getraw', header, compress_chunks(chunks, codec, self.compression))
+        return RawDownload('getraw', header, f, offset, length)
+
+    def mget(self, params):
+        names = self.file.match(params)
+        found, missing = [], []
+        for name in names:
+            if os.path.isfile(name):
+                found.append(name)
+            else:
+                missing.append(name)
+        header = {'status': 'OK', 'data_framing': 'tar', 'data_files': found, 'data_missing': missing}
+        return TarDownload('mget', header, found, self.file.open_read)
+
+    def delta(self, params):
+        # DELTA <nama> <block_size> <panjang> <sha256>, diikuti <panjang> byte operasi delta
+        filename = params[0]
+        block_size = int(params[1])
+        length = int(params[2])
+        expected = params[3].lower()
+        if block_size <= 0 or length < 0:
+            raise ValueError('parameter delta tidak valid')
+        basis = self.file.open_read(filename)
+        return DeltaUpload('delta', self.file.open_upload(filename), basis, block_size, length, expected)
+
+    def post_raw(self, params):
+        params, options = split_options(params)
+        filename = params[0]
+        length = int(params[1])
+        if length < 0:
+            raise ValueError('panjang data tidak valid')
+        return RawUpload('postraw', self.open_upload(filename, options), length)
+
+    def find_header(self, buffer, scan=0, length=None):
+        # Untuk POST, header cukup "POST <nama> [opsi=nilai ...] "; sisanya payload yang di-stream ke disk.
+        # length: jumlah byte valid di buffer (buffer dari pool lebih panjang dari isinya)
+        length = len(buffer) if length is None else length
+        end = buffer.find(TERMINATOR, scan, length)
+        if length >= 5 and buffer[:5].upper() == b'POST ':
+            space = buffer.find(b' ', 5, length)
+            while space >= 0 and (end < 0 or space < end):
+                rest = bytes(buffer[space + 1:min(length, space + 1 + max(map(len, POST_OPTIONS)))])
+                if any(rest.startswith(option) for option in POST_OPTIONS):
+                    space = buffer.find(b' ', space + 1, length)
+                    continue
+                if end < 0 and any(option.startswith(rest) for option in POST_OPTIONS):
+                    # Belum cukup byte untuk membedakan opsi dari awal payload
+                    return None
+                return space, space + 1
+        if end < 0:
+            return None
+        return end, end + len(TERMINATOR)
+
+    def send_chunk(self, connection, chunk, pacer=None):
+        # Tanpa pacing chunk dikirim sekaligus; dengan pacing dipotong per quantum dan tiap potongan menunggu token
+        if pacer is not None and not pacer.active:
+            pacer = None
+        if isinstance(chunk, SendFile):
+            if pacer is None:
+                return connection.sendfile(chunk.file, chunk.offset, chunk.count)
+            sent = 0
+            while sent < chunk.count:
+                count = min(pacer.quantum, chunk.count - sent)
+                pacer.throttle(count)
+                n = connection.sendfile(chunk.file, chunk.offset + sent, count)
+                if n == 0:
+                    break
+                sent += n
+            return sent
+        if pacer is None:
+            connection.sendall(chunk)
+            return len(chunk)
+        view = memoryview(chunk)
+        for start in range(0, len(view), pacer.quantum):
+            piece = view[start:start + pacer.quantum]
+            pacer.throttle(len(piece))
+            connection.sendall(piece)
+        return len(chunk)
+
+    def serve(self, connection, buffer_size=CHUNK_SIZE, pacer=None):
+        with buffer_pool.buffer(buffer_size) as buffer:
+            reader = FrameReader(connection, buffer)
+            found = reader.read_frame(self.find_header)
+            if found is None:
+                return None
+
+            # disk: waktu di begin/feed/generator response; send: waktu mengirim (termasuk tunggu pacing)
+            end, body_start = found
+            bytes_in = reader.length
+            started = time.monotonic()
+            transfer = self.begin(bytes(reader.view[:end]), payload=body_start == end + 1)
+            disk = time.monotonic() - started
+            try:
+                # feed() menerima memoryview ke buffer pool dan tidak boleh menyimpannya setelah kembali
+                if body_start < reader.length:
+                    started = time.monotonic()
+                    transfer.feed(reader.view[body_start:reader.length])
+                    disk += time.monotonic() - started
+                while not transfer.done:
+                    paced = pacer is not None and pacer.active
+                    data = reader.recv(min(buffer_size, pacer.quantum) if paced else buffer_size)
+                    if not data:
+                        raise ConnectionError('koneksi terputus sebelum data selesai diterima')
+                    bytes_in += len(data)
+                    if paced:
+                        pacer.throttle(len(data))
+                    started = time.monotonic()
+                    transfer.feed(data)
+                    disk += time.monotonic() - started
+            except Exception:
+                transfer.abort()
+                raise
+
+        bytes_out = 0
+        send = 0
+        chunks = transfer.response()
+        while True:
+            started = time.monotonic()
+            chunk = next(chunks, None)
+            disk += time.monotonic() - started
+            if chunk is None:
+                break
+            started = time.monotonic()
+            bytes_out += self.send_chunk(connection, chunk, pacer)
+            send += time.monotonic() - started
+        return {'command': transfer.command, 'bytes_in': bytes_in, 'bytes_out': bytes_out,
+                'disk': disk, 'send': send}
@@ -0,0 +1,132 @@
+import time
+import threading
+
+from worker_stats import SlotCounters, OPERATIONS
+
+LATENCY_OPERATIONS = OPERATIONS + ('status', 'other')
+PHASES = ('queue', 'disk', 'send')
+PERCENTILES = (('p50', 0.50), ('p90', 0.90), ('p99', 0.99), ('p999', 0.999))
+
+# Histogram log-linear dalam mikrodetik: tiap rentang [2^k, 2^(k+1)) dibagi 8 bucket linear,
+# jadi galat relatif paling besar 12.5% dari 1 us sampai sekitar 19 jam
+SUB_BITS = 3
+SUB = 1 << SUB_BITS
+MAX_EXPONENT = 36
+BUCKETS = (MAX_EXPONENT - SUB_BITS + 1) * SUB
+# Per fase: BUCKETS counter lalu total mikrodetik; per operasi ditambah bytes_in dan bytes_out
+PHASE_WIDTH = BUCKETS + 1
+OP_WIDTH = len(PHASES) * PHASE_WIDTH + 2
+
+
+def bucket_index(us):
+    us = min(max(int(us), 0), (1 << MAX_EXPONENT) - 1)
+    if us < SUB:
+        return us
+    exponent = us.bit_length() - 1
+    shift = exponent - SUB_BITS
+    return (shift + 1) * SUB + (us >> shift) - SUB
+
+
+def bucket_value(index):
+    # Nilai tengah bucket, dipakai sebagai perkiraan percentil
+    if index < SUB:
+        return index
+    shift = index // SUB - 1
+    low = (SUB + index % SUB) << shift
+    return low + ((1 << shift) - 1) / 2
+
+
+def percentile(counts, q):
+    # Perkiraan nilai (mikrodetik) pada percentil q dari daftar counter bucket
+    target = q * sum(counts)
+    seen = 0
+    for index, count in enumerate(counts):
+        seen += count
+        if count and seen >= target:
+            return bucket_value(index)
+    return 0
+
+
+def operation_index(command):
+    return LATENCY_OPERATIONS.index(command if command in LATENCY_OPERATIONS else 'other')
+
+
+class LatencyHistograms(SlotCounters):
+    """
+    Histogram latensi per operasi untuk fase queue (menunggu worker),
+    disk (begin/feed/menyiapkan response) dan send (mengirim ke client).
+    Di mp_server disimpan di shared memory per proses worker seperti
+    WorkerStats; di mt_server cukup di memori dengan lock antar thread.
+    """
+    def __init__(self, slots=1, shared=True):
+        super().__init__(len(LATENCY_OPERATIONS) * OP_WIDTH, slots, shared)
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def record(self, command, timings, bytes_in=0, bytes_out=0):
+        # timings: {fase: detik}; fase yang tidak ada tidak dicatat
+        base = self._slot_base() + operation_index(command) * OP_WIDTH
+        with self.lock:
+            for p, phase in enumerate(PHASES):
+                seconds = timings.get(phase)
+                if seconds is None:
+                    continue
+                us = int(seconds * 1e6)
+                offset = base + p * PHASE_WIDTH
+                self.values[offset + bucket_index(us)] += 1
+                self.values[offset + BUCKETS] += us
+            self.values[base + len(PHASES) * PHASE_WIDTH] += bytes_in
+            self.values[base + len(PHASES) * PHASE_WIDTH + 1] += bytes_out
+
+    def phase_counts(self, phase):
+        # Counter bucket satu fase, dijumlah dari semua operasi dan semua slot
+        counts = [0] * BUCKETS
+        offset = PHASES.index(phase) * PHASE_WIDTH
+        for o in range(len(LATENCY_OPERATIONS)):
+            counts = list(map(int.__add__, counts, self.totals(o * OP_WIDTH + offset, BUCKETS)))
+        return counts
+
+    @staticmethod
+    def summarize(counts, total_us):
+        n = sum(counts)
+        summary = {'count': n, 'mean_ms': round(total_us / n / 1000, 3)}
+        targets = iter(PERCENTILES)
+        name, q = next(targets)
+        seen = 0
+        for index, count in enumerate(counts):
+            seen += count
+            while seen >= q * n:
+                summary[f'{name}_ms'] = round(bucket_value(index) / 1000, 3)
+                try:
+                    name, q = next(targets)
+                except StopIteration:
+                    return summary
+        return summary
+
+    def snapshot(self):
+        totals = self.totals()
+        result = {}
+        bytes_out_total = 0
+        for o, op in enumerate(LATENCY_OPERATIONS):
+            row = totals[o * OP_WIDTH:(o + 1) * OP_WIDTH]
+            phases = {}
+            for p, phase in enumerate(PHASES):
+                counts = row[p * PHASE_WIDTH:p * PHASE_WIDTH + BUCKETS]
+                if any(counts):
+                    phases[phase] = self.summarize(counts, row[p * PHASE_WIDTH + BUCKETS])
+            if not phases:
+                continue
+            bytes_in, bytes_out = row[-2], row[-1]
+            bytes_out_total += bytes_out
+            send_us = row[PHASES.index('send') * PHASE_WIDTH + BUCKETS]
+            phases['bytes_in'] = bytes_in
+            phases['bytes_out'] = bytes_out
+            # Laju kirim selama fase send berlangsung, bukan rata-rata sejak server hidup
+            phases['send_bytes_per_second'] = round(bytes_out / (send_us / 1e6)) if send_us else None
+            result[op] = phases
+        uptime = time.time() - self.started
+        return {
+            'operations': result,
+            'uptime': round(uptime, 3),
+            'bytes_sent_per_second': round(bytes_out_total / uptime) if uptime > 0 else None,
+        }
@@ -0,0 +1,271 @@
+import os
+import glob
+import json
+import time
+import shutil
+import logging
+import linecache
+import threading
+import tracemalloc
+from collections import Counter
+
+from worker_stats import SlotCounters
+from latency import LATENCY_OPERATIONS, operation_index
+from profiler import PROFILE_DIR
+
+ETS_DIR = os.path.dirname(os.path.abspath(__file__))
+# Alokasi diatribusikan ke baris terdalam yang ada di modul ETS (bukan json/base64/socket)
+ETS_MODULES = {os.path.basename(path) for path in glob.glob(os.path.join(ETS_DIR, '*.py'))}
+DEFAULT_FRAMES = 16
+# Batas jumlah frame yang diterima tracemalloc.start()
+MAX_FRAMES = 65535
+FOLLOW_INTERVAL = 0.2
+TOP_LINES = 15
+# Tunggu file snapshot dari semua proses sampai tidak ada yang baru selama SETTLE detik
+SNAPSHOT_SETTLE = 0.5
+SNAPSHOT_TIMEOUT = 30
+# Kelas ukuran payload (bytes_in + bytes_out) untuk mengelompokkan puncak per request
+SIZE_CLASSES = ((64 * 1024, '<64K'), (1024 * 1024, '<1M'), (16 * 1024 * 1024, '<16M'), (None, '>=16M'))
+# Per operasi dan kelas ukuran: jumlah request, total puncak, puncak terbesar
+CELL = 3
+
+
+def size_class(size):
+    for i, (limit, _) in enumerate(SIZE_CLASSES):
+        if limit is None or size < limit:
+            return i
+
+
+def ets_frame(traceback):
+    # Traceback tracemalloc urut dari frame terluar ke terdalam
+    for frame in reversed(traceback):
+        if os.path.basename(frame.filename) in ETS_MODULES:
+            return frame
+    return None
+
+
+def aggregate(snapshot):
+    # Ukuran alokasi yang masih hidup per baris ETS: {(file, baris): [byte, jumlah blok]}
+    lines = {}
+    for trace in snapshot.traces:
+        frame = ets_frame(trace.traceback)
+        key = (frame.filename, frame.lineno) if frame else ('<lain>', 0)
+        entry = lines.setdefault(key, [0, 0])
+        entry[0] += trace.size
+        entry[1] += 1
+    return lines
+
+
+class MemoryStats(SlotCounters):
+    # Puncak alokasi tracemalloc per request, per operasi dan kelas ukuran payload
+    def __init__(self, slots=1, shared=True):
+        super().__init__(len(LATENCY_OPERATIONS) * len(SIZE_CLASSES) * CELL, slots, shared)
+        self.lock = threading.Lock()
+
+    def record(self, command, payload, peak):
+        offset = self._slot_base() + (operation_index(command) * len(SIZE_CLASSES) + size_class(payload)) * CELL
+        with self.lock:
+            self.values[offset] += 1
+            self.values[offset + 1] += peak
+            self.values[offset + 2] = max(self.values[offset + 2], peak)
+
+    def snapshot(self):
+        totals, maxima = self.totals(), self.maxima()
+        result = {}
+        for o, op in enumerate(LATENCY_OPERATIONS):
+            classes = {}
+            for c, (_, label) in enumerate(SIZE_CLASSES):
+                i = (o * len(SIZE_CLASSES) + c) * CELL
+                if totals[i]:
+                    classes[label] = {
+                        'count': totals[i],
+                        'mean_peak_kb': round(totals[i + 1] / totals[i] / 1024, 1),
+                        'max_peak_kb': round(maxima[i + 2] / 1024, 1),
+                    }
+            if classes:
+                result[op] = classes
+        return result
+
+
+class RequestMemory:
+    # Dipakai server di sekitar fp.serve(); tidak melakukan apa-apa jika tracemalloc mati
+    def __init__(self, tracer):
+        self.tracer = tracer
+        self.start = None
+
+    def __enter__(self):
+        if tracemalloc.is_tracing():
+            self.start = self.tracer.begin()
+        return self
+
+    def record(self, summary):
+        if self.start is None or not summary or not tracemalloc.is_tracing():
+            return
+        peak = max(tracemalloc.get_traced_memory()[1] - self.start, 0)
+        self.tracer.stats.record(summary['command'], summary['bytes_in'] + summary['bytes_out'], peak)
+
+    def __exit__(self, *exc):
+        if self.start is not None:
+            self.tracer.end()
+
+
+class MemoryTracer:
+    """
+    Mode instrumentasi memori yang dinyalakan lewat port kontrol
+    (MEMORY start/snapshot/report/stop). Selama aktif, setiap proses
+    server menjalankan tracemalloc, mencatat puncak alokasi per request,
+    dan saat MEMORY snapshot menulis ukuran alokasi per baris ETS beserta
+    selisihnya dari snapshot sebelumnya; proses yang menerima perintah
+    menggabungkan hasil semua proses.
+    Puncak tracemalloc berlaku untuk seluruh proses, jadi di mt_server dan
+    aio_server request yang berjalan bersamaan ikut terhitung (batas atas);
+    di worker mp_server yang melayani satu request per proses angkanya tepat.
+    """
+    def __init__(self, config, stats, directory=PROFILE_DIR):
+        self.config = config
+        self.stats = stats
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.active = 0
+
+    def request(self):
+        return RequestMemory(self)
+
+    def begin(self):
+        with self.lock:
+            # reset_peak berlaku untuk seluruh proses, jadi hanya saat tidak ada request lain berjalan
+            if not self.active:
+                tracemalloc.reset_peak()
+            self.active += 1
+        return tracemalloc.get_traced_memory()[0]
+
+    def end(self):
+        with self.lock:
+            self.active -= 1
+
+    def session_dir(self, session):
+        return os.path.join(self.directory, f"memory-{session}")
+
+    def snapshot_dir(self, session, seq):
+        return os.path.join(self.session_dir(session), str(seq))
+
+    def follow(self):
+        threading.Thread(target=self._follow, name='memtrace', daemon=True).start()
+
+    def _follow(self):
+        session, seq, baseline = 0, self.config.get('memory_snapshot'), {}
+        while True:
+            time.sleep(FOLLOW_INTERVAL)
+            current = self.config.get('memory_session')
+            if current != session:
+                session = current
+                if tracemalloc.is_tracing():
+                    tracemalloc.stop()
+                baseline = {}
+                if session:
+                    try:
+                        tracemalloc.start(self.config.get('memory_frames'))
+                    except Exception as e:
+                        logging.error(f"Error memulai tracemalloc: {e}")
+            requested = self.config.get('memory_snapshot')
+            if requested != seq:
+                seq = requested
+                if session:
+                    try:
+                        baseline = self.dump(session, seq, baseline)
+                    except Exception as e:
+                        logging.error(f"Error di snapshot memori: {e}")
+
+    def dump(self, session, seq, baseline):
+        # Alokasi milik pelacak sendiri (linecache, tracemalloc, modul ini) tidak ikut dilaporkan
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, linecache.__file__),
+            tracemalloc.Filter(False, __file__),
+        ])
+        lines = aggregate(snapshot)
+        traced, peak = tracemalloc.get_traced_memory()
+        report = {
+            'pid': os.getpid(), 'traced': traced, 'peak': peak,
+            'lines': [[name, lineno, size, count, size - baseline.get((name, lineno), [0])[0]]
+                      for (name, lineno), (size, count) in lines.items()],
+        }
+        directory = self.snapshot_dir(session, seq)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"{os.getpid()}.json.tmp"), 'w') as f:
+            json.dump(report, f)
+        os.replace(os.path.join(directory, f"{os.getpid()}.json.tmp"), os.path.join(directory, f"{os.getpid()}.json"))
+        return lines
+
+    def collect(self, session, seq):
+        directory = self.snapshot_dir(session, seq)
+        deadline = time.monotonic() + SNAPSHOT_TIMEOUT
+        seen, stable_since = -1, time.monotonic()
+        while time.monotonic() < deadline:
+            count = len(glob.glob(os.path.join(directory, '*.json')))
+            if count != seen:
+                seen, stable_since = count, time.monotonic()
+            elif count and time.monotonic() - stable_since >= SNAPSHOT_SETTLE:
+                break
+            time.sleep(0.05)
+        sizes, diffs, blocks = Counter(), Counter(), Counter()
+        traced = peak = processes = 0
+        for path in glob.glob(os.path.join(directory, '*.json')):
+            with open(path) as f:
+                report = json.load(f)
+            processes += 1
+            traced += report['traced']
+            peak += report['peak']
+            for name, lineno, size, count, diff in report['lines']:
+                key = (name, lineno)
+                sizes[key] += size
+                blocks[key] += count
+                diffs[key] += diff
+        shutil.rmtree(directory, ignore_errors=True)
+
+        def describe(key):
+            name, lineno = key
+            return {
+                'line': f"{os.path.basename(name)}:{lineno}",
+                'code': linecache.getline(name, lineno).strip(),
+                'size_kb': round(sizes[key] / 1024, 1),
+                'blocks': blocks[key],
+                'diff_kb': round(diffs[key] / 1024, 1),
+            }
+        return {
+            'processes': processes,
+            'traced_kb': round(traced / 1024, 1),
+            'peak_kb': round(peak / 1024, 1),
+            'top': [describe(key) for key, _ in sizes.most_common(TOP_LINES)],
+            'top_growth': [describe(key) for key, diff in diffs.most_common(TOP_LINES) if diff > 0],
+        }
+
+    def control(self, params):
+        # MEMORY start [frames] | MEMORY snapshot | MEMORY report | MEMORY stop
+        action = params[0].lower() if params else 'report'
+        session = self.config.get('memory_session')
+        if action == 'start':
+            if session:
+                raise ValueError('pelacakan memori sudah berjalan')
+            frames = int(params[1]) if len(params) > 1 else DEFAULT_FRAMES
+            if not 1 <= frames <= MAX_FRAMES:
+                raise ValueError(f'jumlah frame harus antara 1 dan {MAX_FRAMES}')
+            self.config.set('memory_frames', frames)
+            self.config.set('memory_session', int(time.time() * 1000))
+            logging.warning(f"Pelacakan memori dimulai ({frames} frame)")
+            return {'status': 'OK', 'memory_tracing': True, 'frames': frames}
+        if action == 'snapshot':
+            if not session:
+                raise ValueError('pelacakan memori tidak sedang berjalan')
+            seq = self.config.get('memory_snapshot') + 1
+            self.config.set('memory_snapshot', seq)
+            return {'status': 'OK', 'snapshot': seq, **self.collect(session, seq)}
+        if action == 'report':
+            return {'status': 'OK', 'memory_tracing': bool(session), 'requests': self.stats.snapshot()}
+        if action == 'stop':
+            self.config.set('memory_session', 0)
+            if session:
+                shutil.rmtree(self.session_dir(session), ignore_errors=True)
+            logging.warning("Pelacakan memori dihentikan")
+            return {'status': 'OK', 'memory_tracing': False, 'requests': self.stats.snapshot()}
+        raise ValueError(f"perintah memory tidak dikenal: {action}")
@@ -1,38 +1,57 @@
+import os
+import time
+import select
+import signal
 import socket
 import logging
 import threading
 from concurrent.futures import ProcessPoolExecutor
 import multiprocessing
+from multiprocessing.connection import wait
 
 from file_protocol import FileProtocol
+from worker_stats import WorkerStats
+from latency import LatencyHistograms
+from control_port import serve_control
+from runtime_config import RuntimeConfig, MB, MAX_WORKERS, worker_count
+from autoscaler import Autoscaler
+from profiler import Profiler
+from memtrace import MemoryStats, MemoryTracer
+from file_interface import CACHE_BUDGET
 fp = FileProtocol()
 
 SERVER_ADDRESS = ('0.0.0.0', 6667)
 BUFFER_SIZE = 1024 * 1024
+BACKLOG = 128
+# Seberapa sering accept loop memeriksa PAUSE/RESUME dan sinyal berhenti
+POLL_INTERVAL = 0.2
+# Minimal slot statistik, supaya worker tambahan dari perintah WORKERS tetap dapat slot sendiri
+MIN_STAT_SLOTS = 64
 
-manager = multiprocessing.Manager()
-worker_status = manager.dict({"success": 0, "fail": 0})
+# Dibuat di main() sebelum worker di-fork; worker mewarisi blok shared memory yang sama
+worker_status = None
+latency = None
+config = None
+profiler = None
+memory = None
+memory_tracer = None
+# Diset handler SIGUSR1 di worker pre-fork yang diminta berhenti (jumlah worker dikurangi)
+retiring = False
 
-def process_client(connection, address, sema, worker_status):
-    d = ''
+def process_client(connection, address, accepted=None):
+    # accepted: waktu (monotonic, sama di semua proses) saat koneksi di-accept
+    queue_wait = time.monotonic() - accepted if accepted is not None else None
+    worker_status.add('active')
     try:
-        while True:
-            data = connection.recv(BUFFER_SIZE)
-            if data:
-                d += data.decode()
-                if "\r\n\r\n" in d:
-                    try:
-                        hasil = fp.process_string(d.strip())
-                        hasil = hasil + "\r\n\r\n"
-                        connection.sendall(hasil.encode())
-                        worker_status["success"] += 1
-                    except Exception as e:
-                        error_response = '{"status":"ERROR","data":"server error: %s"}\r\n\r\n' % str(e).replace('"', "'")
-                        connection.sendall(error_response.encode())
-                        worker_status["fail"] += 1
-                    break
-            else:
-                break
+        config.apply(fp)
+        with memory_tracer.request() as mem:
+            summary = fp.serve(connection, config.buffer_size)
+            mem.record(summary)
+        if summary:
+            timings = {'queue': queue_wait, 'disk': summary['disk'], 'send': summary['send']}
+            latency.record(summary['command'], timings, summary['bytes_in'], summary['bytes_out'])
+        if summary and summary['command'] != 'status':
+            worker_status.record(summary)
     except Exception as e:
         logging.error(f"Error handling client {address}: {e}")
         try:
@@ -40,63 +59,325 @@ def process_client(connection, address, sema, worker_status):
             connection.sendall(error_response.encode())
         except Exception:
             pass
-        worker_status["fail"] += 1
+        worker_status.add("fail")
     finally:
+        worker_status.add('active', -1)
         connection.close()
-        sema.release()
 
 
 
+def start_worker():
+    # Thread profiler dan pelacak memori tidak ikut ter-fork, jadi setiap worker menjalankan miliknya sendiri
+    profiler.follow()
+    memory_tracer.follow()
+
+
+def accept_ready(listener):
+    # None jika belum ada koneksi dalam POLL_INTERVAL, server di-pause, atau koneksi sudah diambil worker lain
+    if not select.select([listener], [], [], POLL_INTERVAL)[0] or config.paused:
+        return None
+    try:
+        connection, address = listener.accept()
+    except BlockingIOError:
+        return None
+    connection.setblocking(True)
+    return connection, address
+
+
+class PoolSegment:
+    # Satu ProcessPoolExecutor berukuran size beserta tugas yang sedang diserahkan kepadanya
+    def __init__(self, size, context):
+        self.size = size
+        self.executor = ProcessPoolExecutor(max_workers=size, mp_context=context, initializer=start_worker)
+        self.futures = set()
+
+    def load(self):
+        return len(self.futures) / self.size
+
+
 class Server:
+    """
+    Process pool yang terdiri dari beberapa segmen ProcessPoolExecutor.
+    Menambah worker (WORKERS atau autoscaler) membuat segmen baru hanya
+    untuk tambahannya; mengurangi worker menghentikan segmen terbaru.
+    Worker di segmen lama tetap hidup beserta cache GET, index dan koneksi
+    SQLite-nya yang sudah hangat. Request diberikan ke segmen yang paling
+    sedikit bebannya per worker.
+    """
     def __init__(self, ipaddress='0.0.0.0', port=8889, max_workers=10):
         self.ipinfo = (ipaddress, port)
         self.my_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.my_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.max_workers = max_workers
-        
+        # fork agar worker pool mewarisi fp, worker_status dan config
+        self.context = multiprocessing.get_context('fork')
+        self.lock = threading.Lock()
+        self.segments = []
+        self.futures = set()
+        self.resize(max_workers)
+
+    def workers(self):
+        return self.max_workers
+
+    def resize(self, count):
+        # Segmen yang dilepas menyelesaikan tugas yang sudah diserahkan lalu berhenti sendiri
+        retired = []
+        with self.lock:
+            total = sum(segment.size for segment in self.segments)
+            while self.segments and total > count:
+                segment = self.segments.pop()
+                total -= segment.size
+                retired.append(segment)
+            # Segmen terakhir yang hanya sebagian berlebih diganti segmen yang lebih kecil
+            if total < count:
+                self.segments.append(PoolSegment(count - total, self.context))
+            self.max_workers = count
+        for segment in retired:
+            segment.executor.shutdown(wait=False)
+
+    def inflight(self):
+        return len(self.futures)
+
+    def load(self):
+        busy = worker_status['active']
+        return {'workers': self.max_workers, 'busy': busy, 'queued': max(0, len(self.futures) - busy)}
+
+    def submit(self, connection, address):
+        with self.lock:
+            segment = min(self.segments, key=PoolSegment.load)
+            future = segment.executor.submit(process_client, connection, address, time.monotonic())
+            self.futures.add(future)
+            segment.futures.add(future)
+        future.add_done_callback(self.futures.discard)
+        future.add_done_callback(segment.futures.discard)
+
     def run(self):
         logging.warning(f"server berjalan di ip address {self.ipinfo} dengan max_workers={self.max_workers}")
         self.my_socket.bind(self.ipinfo)
         self.my_socket.listen(10)
+        self.my_socket.setblocking(False)
+
+        try:
+            while True:
+                if config.paused:
+                    time.sleep(POLL_INTERVAL)
+                    continue
+                accepted = accept_ready(self.my_socket)
+                if accepted is None:
+                    continue
+                connection, address = accepted
+                logging.warning(f"Accepted connection from {address}")
+                self.submit(connection, address)
+        except KeyboardInterrupt:
+            logging.warning("Server shutting down.")
+            logging.warning(f"Worker Success: {worker_status['success']}")
+            logging.warning(f"Worker Fail: {worker_status['fail']}")
+        finally:
+            self.my_socket.close()
+            for segment in self.segments:
+                segment.executor.shutdown()
+
+
+def open_listener(ipinfo, reuse_port=False):
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    listener.bind(ipinfo)
+    listener.listen(BACKLOG)
+    return listener
+
+
+def retire(signum, frame):
+    # Worker tidak dihentikan di tengah request; loop accept memeriksa flag ini
+    global retiring
+    retiring = True
+
+
+def prefork_worker(listener, ipinfo):
+    # Tiap worker accept sendiri; dengan SO_REUSEPORT kernel yang membagi koneksi ke socket tiap worker
+    signal.signal(signal.SIGUSR1, retire)
+    start_worker()
+    own_listener = listener is None
+    if own_listener:
+        listener = open_listener(ipinfo, reuse_port=True)
+    # Non-blocking dan select dengan timeout supaya PAUSE dan SIGUSR1 tetap terlihat walau tidak ada koneksi masuk
+    listener.setblocking(False)
+    try:
+        while not retiring:
+            if config.paused:
+                time.sleep(POLL_INTERVAL)
+                continue
+            accepted = accept_ready(listener)
+            if accepted is None:
+                continue
+            connection, address = accepted
+            logging.warning(f"Accepted connection from {address}")
+            process_client(connection, address, time.monotonic())
+        if own_listener:
+            # Koneksi yang sudah dibagikan kernel ke socket ini akan di-reset saat socket ditutup,
+            # jadi layani dulu sisa antriannya
+            while True:
+                try:
+                    connection, address = listener.accept()
+                except BlockingIOError:
+                    break
+                connection.setblocking(True)
+                process_client(connection, address, time.monotonic())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.close()
+
+
+class PreforkServer:
+    """
+    N proses worker yang masing-masing menerima koneksinya sendiri, tanpa
+    menyerahkan socket antar proses per koneksi. Jika SO_REUSEPORT tersedia
+    setiap worker membuka socket sendiri di port yang sama; jika tidak,
+    worker mewarisi satu socket listening yang dibuka sebelum fork.
+    """
+    def __init__(self, ipaddress='0.0.0.0', port=8889, max_workers=10):
+        self.ipinfo = (ipaddress, port)
+        self.max_workers = max_workers
+        self.reuse_port = hasattr(socket, 'SO_REUSEPORT')
+        # fork agar fp (termasuk chdir ke files/) dan socket listening diwarisi worker
+        self.context = multiprocessing.get_context('fork')
+        self.lock = threading.Lock()
+        self.listener = None
+        self.pool = []
+        # Worker yang sudah dikirimi SIGUSR1 dan sedang menyelesaikan request terakhirnya
+        self.retired = []
+
+    def workers(self):
+        return len(self.pool)
+
+    def spawn(self):
+        process = self.context.Process(target=prefork_worker, args=(self.listener, self.ipinfo), daemon=True)
+        process.start()
+        return process
+
+    def resize(self, count):
+        with self.lock:
+            while len(self.pool) < count:
+                self.pool.append(self.spawn())
+            while len(self.pool) > count:
+                process = self.pool.pop()
+                os.kill(process.pid, signal.SIGUSR1)
+                self.retired.append(process)
+
+    def inflight(self):
+        return worker_status['active']
+
+    def load(self):
+        # Antrian accept ada di kernel (per socket SO_REUSEPORT) dan tidak terlihat dari sini
+        return {'workers': len(self.pool), 'busy': worker_status['active'], 'queued': 0}
+
+    def run(self):
+        mode = "SO_REUSEPORT" if self.reuse_port else "socket bersama"
+        logging.warning(f"server pre-fork berjalan di {self.ipinfo} dengan {self.max_workers} worker ({mode})")
+        self.listener = None if self.reuse_port else open_listener(self.ipinfo)
+
+        self.resize(self.max_workers)
+        try:
+            while True:
+                wait([p.sentinel for p in self.pool + self.retired], POLL_INTERVAL)
+                with self.lock:
+                    self.retired = [p for p in self.retired if p.is_alive()]
+                    # Worker yang mati (mis. crash) langsung diganti supaya jumlah worker tetap
+                    for i, p in enumerate(self.pool):
+                        if not p.is_alive():
+                            logging.warning(f"Worker pid {p.pid} berhenti (exit code {p.exitcode}), menjalankan pengganti")
+                            self.pool[i] = self.spawn()
+        except KeyboardInterrupt:
+            logging.warning("Server shutting down.")
+            logging.warning(f"Worker Success: {worker_status['success']}")
+            logging.warning(f"Worker Fail: {worker_status['fail']}")
+        finally:
+            for p in self.pool + self.retired:
+                p.terminate()
+            for p in self.pool + self.retired:
+                p.join()
+            if self.listener is not None:
+                self.listener.close()
+
+
+def control_workers(svr, highest, params):
+    # WORKERS <n>: pool diganti dengan pool baru, atau worker pre-fork ditambah/dihentikan setelah request terakhirnya
+    count = worker_count(params, highest=highest)
+    svr.resize(count)
+    logging.warning(f"Jumlah worker diubah menjadi {count}")
+    return {'status': 'OK', 'workers': svr.workers()}
+
+
+def control_config(svr, params):
+    return {'status': 'OK', 'workers': svr.workers(), 'inflight': svr.inflight(), **config.snapshot()}
+
+
+def control_stats(params):
+    return {'status': 'OK', **dict(worker_status)}
 
-        manager = multiprocessing.Manager()
-        worker_status = manager.dict({"success": 0, "fail": 0})
-
-        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
-            try:
-                while True:
-                    connection, address = self.my_socket.accept()
-                    logging.warning(f"Accepted connection from {address}")
-                    executor.submit(process_client, connection, address, executor._max_workers, worker_status)
-            except KeyboardInterrupt:
-                logging.warning("Server shutting down.")
-                logging.warning(f"Worker Success: {worker_status['success']}")
-                logging.warning(f"Worker Fail: {worker_status['fail']}")
-            finally:
-                self.my_socket.close()
-
-
-def send_server_workers(max_workers):
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.bind(('0.0.0.0', 6668))
-        s.listen()
-        while True:
-            conn, addr = s.accept()
-            with conn:
-                logging.warning(f"Sending max_workers to {addr}")
-                conn.sendall(max_workers.to_bytes(4, 'big'))
 
 def main():
+    global worker_status, latency, config, profiler, memory, memory_tracer
     max_workers = 10
     try:
         max_workers = int(input("Masukkan jumlah max workers server: "))
     except Exception:
         print("Input salah, menggunakan default max_workers=10")
 
-    threading.Thread(target=send_server_workers, args=(max_workers,), daemon=True).start()
+    # Ukuran buffer dan budget cache bisa diubah lewat port kontrol (BUFFER, CACHE); worker membaca dari shared memory
+    config = RuntimeConfig(BUFFER_SIZE, CACHE_BUDGET)
+    try:
+        cache_mb = int(input("Masukkan budget cache GET dalam MB (default 256): "))
+        config.set('cache_budget', cache_mb * MB)
+    except Exception:
+        print("Menggunakan budget cache default")
+    profiler = Profiler(config)
+
+    if input("Aktifkan penyimpanan deduplikasi (content-addressed)? [y/N]: ").strip().lower() == 'y':
+        fp.file.dedup = True
 
-    svr = Server(SERVER_ADDRESS[0], SERVER_ADDRESS[1], max_workers=max_workers)
-    svr.run()
+    prefork = input("Mode worker: [1] process pool [2] pre-fork (default 1): ").strip() == '2'
+
+    # Tanpa batas autoscaler tetap dibuat tetapi nonaktif; bisa dinyalakan dengan AUTOSCALE on min=<n> max=<n>
+    bounds = input("Batas autoscaling worker 'min max' (kosong = jumlah worker tetap): ").split()
+    enabled = len(bounds) == 2 and all(b.isdigit() for b in bounds) and 1 <= int(bounds[0]) <= int(bounds[1])
+    minimum, maximum = (int(bounds[0]), int(bounds[1])) if enabled else (max_workers, max_workers)
+
+    # Slot cadangan untuk worker pengganti dan tambahan; slot worker yang mati juga diklaim ulang
+    slots = max(MIN_STAT_SLOTS, max_workers * 2, maximum * 2)
+    worker_status = WorkerStats(slots)
+    fp.worker_status = worker_status
+    latency = LatencyHistograms(slots)
+    fp.status_providers['latency'] = latency.snapshot
+    memory = MemoryStats(slots)
+    # Separuh slot disisakan untuk worker pengganti, jadi WORKERS/AUTOSCALE dibatasi slots // 2
+    highest = min(MAX_WORKERS, slots // 2)
+    memory_tracer = MemoryTracer(config, memory)
+    fp.status_providers['memory'] = memory.snapshot
+
+    server_class = PreforkServer if prefork else Server
+    svr = server_class(SERVER_ADDRESS[0], SERVER_ADDRESS[1], max_workers=max_workers)
+    # Keputusan autoscaler hanya ada di proses induk, jadi dilaporkan lewat port kontrol (AUTOSCALE), bukan STATUS
+    autoscaler = Autoscaler(svr.load, svr.resize, minimum, maximum, latency, enabled, highest=highest).start()
+
+    commands = {
+        'stats': control_stats, 'autoscale': autoscaler.control,
+        'profile': profiler.control, 'memory': memory_tracer.control,
+        'workers': lambda params: control_workers(svr, highest, params),
+        'config': lambda params: control_config(svr, params),
+        'drain': lambda params: config.drain(svr.inflight, params), **config.commands(),
+    }
+    threading.Thread(target=serve_control, args=(svr.workers, commands), daemon=True).start()
+    profiler.follow()
+    memory_tracer.follow()
+    try:
+        svr.run()
+    finally:
+        worker_status.close(unlink=True)
+        latency.close(unlink=True)
+        memory.close(unlink=True)
 
 if __name__ == "__main__":
     main()
@@ -8,6 +8,8 @@ import glob
 import csv
 from concurrent.futures import ProcessPoolExecutor, as_completed
 
+from file_client_cli import read_body
+
 # Konfigurasi alamat dan port server
 SERVER_IP = "172.16.16.101"
 PORT_KONTROL = 6668
@@ -26,28 +28,32 @@ def get_jumlah_worker_server(ip_server):
         return None
 
 # Mengirimkan perintah ke server
-def kirim_perintah(perintah, ip_server):
+def kirim_perintah(perintah, ip_server, payload=None, sink=None):
     try:
         soket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         soket.connect((ip_server, PORT_OPERASI))
         soket.sendall(perintah.encode())
-        data_diterima = ""
-        while True:
-            data = soket.recv(1024 * 1024)
-            if not data:
-                break
-            data_diterima += data.decode()
-            if "\r\n\r\n" in data_diterima:
-                break
+        if payload is not None:
+            soket.sendfile(payload)
+        with soket.makefile('rb') as stream:
+            hasil = json.loads(stream.readline())
+            if hasil.get('data_framing'):
+                stream.readline()
+                read_body(stream, hasil, sink)
         soket.close()
-        return json.loads(data_diterima)
+        return hasil
     except Exception as error:
         logging.error(f"[KESALAHAN CLIENT] {error}")
         return {"status": "ERROR", "data": str(error)}
 
 # Operasi POST (unggah file ke server)
-def unggah_file(nama_file, ip_server):
+def unggah_file(nama_file, ip_server, mode='base64'):
     try:
+        if mode == 'binary':
+            with open(nama_file, 'rb') as file:
+                ukuran = os.fstat(file.fileno()).st_size
+                hasil = kirim_perintah(f"POSTRAW {nama_file} {ukuran}\r\n\r\n", ip_server, payload=file)
+            return hasil['status'] == 'OK'
         with open(nama_file, 'rb') as file:
             encoded_data = base64.b64encode(file.read()).decode()
         perintah = f"POST {nama_file} {encoded_data}\r\n\r\n"
@@ -57,12 +63,17 @@ def unggah_file(nama_file, ip_server):
         return False
 
 # Operasi GET (unduh file dari server)
-def unduh_file(nama_file, ip_server):
+def unduh_file(nama_file, ip_server, mode='base64'):
     try:
-        perintah = f"GET {nama_file}\r\n\r\n"
-        hasil = kirim_perintah(perintah, ip_server)
         ekstensi = nama_file.split('.')[-1]
         nama_baru = nama_file.split('.')[0] + "_" + str(time.time()) + '.' + ekstensi
+        if mode == 'binary':
+            with open(nama_baru, 'wb') as file:
+                hasil = kirim_perintah(f"GETRAW {nama_file}\r\n\r\n", ip_server, sink=file)
+            os.remove(nama_baru)
+            return hasil['status'] == 'OK'
+        perintah = f"GET {nama_file}\r\n\r\n"
+        hasil = kirim_perintah(perintah, ip_server)
         if hasil['status'] == 'OK':
             with open(nama_baru, 'wb') as file:
                 file.write(base64.b64decode(hasil['data_file']))
@@ -82,15 +93,15 @@ def lihat_daftar_file(ip_server):
         return False
 
 # Fungsi worker untuk tiap proses klien
-def proses_klien(id_klien, jenis_operasi="list", ukuran_file_mb=10, ip_server=""):
+def proses_klien(id_klien, jenis_operasi="list", ukuran_file_mb=10, ip_server="", mode='base64'):
     nama_file = f"{ukuran_file_mb}mb.bin"
     try:
         waktu_mulai = time.time()
 
         if jenis_operasi == "post":
-            sukses = unggah_file(nama_file, ip_server)
+            sukses = unggah_file(nama_file, ip_server, mode)
         elif jenis_operasi == "get":
-            sukses = unduh_file(nama_file, ip_server)
+            sukses = unduh_file(nama_file, ip_server, mode)
         elif jenis_operasi == "list":
             sukses = lihat_daftar_file(ip_server)
         else:
@@ -105,12 +116,12 @@ def proses_klien(id_klien, jenis_operasi="list", ukuran_file_mb=10, ip_server=""
         return {"client_id": id_klien, "status": False, "duration": 0, "throughput": "-"}
 
 # Menjalankan uji stres (stress test)
-def jalankan_stress_test(operasi, ukuran_mb, jumlah_klien, ip_server):
+def jalankan_stress_test(operasi, ukuran_mb, jumlah_klien, ip_server, mode='base64'):
     hasil_semua = []
     print(f"{'Client':<10} {'Status':<10} {'Durasi (s)':<15} {'Throughput (B/s)':<20}")
     print("="*60)
     with ProcessPoolExecutor(max_workers=jumlah_klien) as executor:
-        tugas = [executor.submit(proses_klien, i, operasi, ukuran_mb, ip_server) for i in range(jumlah_klien)]
+        tugas = [executor.submit(proses_klien, i, operasi, ukuran_mb, ip_server, mode) for i in range(jumlah_klien)]
         for future in as_completed(tugas):
             try:
                 hasil = future.result()
@@ -121,18 +132,47 @@ def jalankan_stress_test(operasi, ukuran_mb, jumlah_klien, ip_server):
             hasil_semua.append(hasil)
     return hasil_semua
 
+def hitung_fairness(daftar_throughput):
+    # Jain's fairness index: 1 berarti semua client mendapat throughput yang sama, 1/n berarti satu client mendominasi
+    if not daftar_throughput:
+        return "-", "-", "-"
+    jumlah = sum(daftar_throughput)
+    kuadrat = sum(t * t for t in daftar_throughput)
+    indeks = round(jumlah * jumlah / (len(daftar_throughput) * kuadrat), 4) if kuadrat > 0 else "-"
+    return min(daftar_throughput), max(daftar_throughput), indeks
+
+
+def siapkan_csv(nama_file, kolom):
+    # File hasil dengan header lama (mis. sebelum kolom fairness ditambahkan) dipindah ke nama lain,
+    # supaya baris baru tidak ditulis di bawah header dengan jumlah kolom berbeda.
+    # Mengembalikan True jika file dengan header yang sama sudah ada
+    if not os.path.isfile(nama_file):
+        return False
+    with open(nama_file, newline='') as f:
+        header = next(csv.reader(f), None)
+    if header == kolom:
+        return True
+    nama_lama = f"{os.path.splitext(nama_file)[0]}_lama_{time.strftime('%Y%m%d_%H%M%S')}.csv"
+    os.replace(nama_file, nama_lama)
+    print(f"Kolom {nama_file} berbeda, hasil lama dipindah ke {nama_lama}")
+    return False
+
+
 # Menyimpan hasil uji ke file CSV
-def simpan_hasil_csv(hasil, operasi, ukuran, klien, worker_server):
+def simpan_hasil_csv(hasil, operasi, ukuran, klien, worker_server, mode='base64'):
     nama_file_ringkasan = 'stress_test_results_multiprocess.csv'
-    sudah_ada = os.path.isfile(nama_file_ringkasan)
+    if mode == 'binary':
+        nama_file_ringkasan = 'stress_test_results_multiprocess_binary.csv'
+    nama_kolom = [
+        'No', 'Operation', 'Volume', 'Client Workers',
+        'Server Workers', 'Average Time (s)', 'Average Throughput (bytes/s)',
+        'Success Clients', 'Failed Clients',
+        'Success Server Workers', 'Failed Server Workers',
+        'Min Throughput (bytes/s)', 'Max Throughput (bytes/s)', 'Fairness Index'
+    ]
+    sudah_ada = siapkan_csv(nama_file_ringkasan, nama_kolom)
 
     with open(nama_file_ringkasan, 'a', newline='') as file_csv:
-        nama_kolom = [
-            'No', 'Operation', 'Volume', 'Client Workers',
-            'Server Workers', 'Average Time (s)', 'Average Throughput (bytes/s)',
-            'Success Clients', 'Failed Clients',
-            'Success Server Workers', 'Failed Server Workers'
-        ]
         penulis = csv.DictWriter(file_csv, fieldnames=nama_kolom)
         if not sudah_ada:
             penulis.writeheader()
@@ -152,6 +192,8 @@ def simpan_hasil_csv(hasil, operasi, ukuran, klien, worker_server):
 
         rata_rata_durasi = round(total_durasi / sukses, 4) if sukses > 0 else "-"
         rata_rata_throughput = round(total_throughput / sukses, 4) if sukses > 0 and operasi != 'list' else "-"
+        throughput_min, throughput_max, fairness = hitung_fairness(
+            [h['throughput'] for h in hasil if h['status'] and h['throughput'] != "-"])
 
         sukses_server = sukses if sukses <= worker_server else worker_server
         gagal_server = worker_server - sukses_server if worker_server > 0 else 0
@@ -172,7 +214,10 @@ def simpan_hasil_csv(hasil, operasi, ukuran, klien, worker_server):
             'Success Clients': sukses,
             'Failed Clients': gagal,
             'Success Server Workers': sukses_server,
-            'Failed Server Workers': gagal_server
+            'Failed Server Workers': gagal_server,
+            'Min Throughput (bytes/s)': throughput_min,
+            'Max Throughput (bytes/s)': throughput_max,
+            'Fairness Index': fairness
         })
 
 
@@ -190,6 +235,8 @@ if __name__ == '__main__':
         print("Gagal mendapatkan jumlah worker server, menggunakan default 10")
         worker_server = 10
 
+    mode = 'binary' if input("Mode transfer: [1] base64 [2] biner: ").strip() == '2' else 'base64'
+
     print("Pilih mode pengujian:")
     print("1 - Jalankan semua kombinasi operasi, ukuran file, dan jumlah klien")
     print("2 - Masukkan operasi, ukuran file, dan jumlah klien secara manual")
@@ -204,8 +251,8 @@ if __name__ == '__main__':
                         os.remove(file)
                 for klien in jumlah_klien_tersedia:
                     print(f"\nMenjalankan uji: Operasi={operasi}, File={ukuran}mb.bin, Jumlah Klien={klien}")
-                    hasil = jalankan_stress_test(operasi, ukuran, klien, SERVER_IP)
-                    simpan_hasil_csv(hasil, operasi, ukuran, klien, worker_server)
+                    hasil = jalankan_stress_test(operasi, ukuran, klien, SERVER_IP, mode)
+                    simpan_hasil_csv(hasil, operasi, ukuran, klien, worker_server, mode)
     elif pilihan == '2':
         operasi_dipilih = input(f"Masukkan operasi ({'/'.join(daftar_operasi)}): ").strip().lower()
         while operasi_dipilih not in daftar_operasi:
@@ -236,7 +283,7 @@ if __name__ == '__main__':
                 os.remove(file)
 
         print(f"\nMenjalankan uji: Operasi={operasi_dipilih}, File={ukuran_dipilih}mb.bin, Jumlah Klien={klien_dipilih}")
-        hasil = jalankan_stress_test(operasi_dipilih, ukuran_dipilih, klien_dipilih, SERVER_IP)
-        simpan_hasil_csv(hasil, operasi_dipilih, ukuran_dipilih, klien_dipilih, worker_server)
+        hasil = jalankan_stress_test(operasi_dipilih, ukuran_dipilih, klien_dipilih, SERVER_IP, mode)
+        simpan_hasil_csv(hasil, operasi_dipilih, ukuran_dipilih, klien_dipilih, worker_server, mode)
     else:
         print("Pilihan tidak valid, program dihentikan.")
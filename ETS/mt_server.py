@@ -1,47 +1,61 @@
+import time
 import socket
 import logging
+import selectors
 import threading
-from concurrent.futures import ThreadPoolExecutor
 # Tambahkan global shared state
 from collections import defaultdict
-import json
 
 worker_status = defaultdict(int)
 worker_lock = threading.Lock()
 
 from file_protocol import FileProtocol
-fp = FileProtocol()
+from worker_stats import operation_field
+from control_port import serve_control
+from scheduler import Scheduler, METADATA_SHARE, QUEUE_LIMIT
+from pacing import Pacer, MB
+from latency import LatencyHistograms
+from runtime_config import RuntimeConfig, worker_count
+from autoscaler import Autoscaler
+from profiler import Profiler
+from memtrace import MemoryStats, MemoryTracer
+from file_interface import CACHE_BUDGET
+fp = FileProtocol(worker_status)
+# Batas bandwidth diisi di main(); 0 berarti tanpa batas
+pacer = Pacer()
+latency = LatencyHistograms(shared=False)
+fp.status_providers['latency'] = latency.snapshot
 
 SERVER_ADDRESS = ('0.0.0.0', 6667)
 BUFFER_SIZE = 1024 * 1024
+# Cukup untuk membaca nama perintah tanpa mengambil data dari socket
+PEEK_SIZE = 16
+# Seberapa sering accept loop memeriksa PAUSE/RESUME
+POLL_INTERVAL = 0.2
+# Ukuran buffer dan budget cache bisa diubah lewat port kontrol (BUFFER, CACHE)
+config = RuntimeConfig(BUFFER_SIZE, CACHE_BUDGET)
+profiler = Profiler(config)
+memory = MemoryStats(shared=False)
+memory_tracer = MemoryTracer(config, memory)
+fp.status_providers['memory'] = memory.snapshot
 
-def process_client_thread(connection, address):
-    d = ''
+def process_client_thread(connection, address, queued=None):
+    # queued: waktu (monotonic) saat koneksi masuk antrian lane
+    queue_wait = time.monotonic() - queued if queued is not None else None
     try:
-        while True:
-            data = connection.recv(BUFFER_SIZE)
-            if data:
-                d += data.decode()
-                if "\r\n\r\n" in d:
-                    cmd = d.strip()
-                    if cmd.upper() == "STATUS":
-                        with worker_lock:
-                            status_resp = {
-                                "status": "OK",
-                                "success_worker": worker_status.get('success', 0),
-                                "fail_worker": worker_status.get('fail', 0)
-                            }
-                        response = json.dumps(status_resp) + "\r\n\r\n"
-                        connection.sendall(response.encode())
-                    else:
-                        hasil = fp.process_string(cmd)
-                        hasil = hasil + "\r\n\r\n"
-                        connection.sendall(hasil.encode())
-                        with worker_lock:
-                            worker_status['success'] += 1
-                    break
-            else:
-                break
+        config.apply(fp)
+        with pacer.connection(address[0]) as pace, memory_tracer.request() as mem:
+            summary = fp.serve(connection, config.buffer_size, pace)
+            mem.record(summary)
+        if summary:
+            timings = {'queue': queue_wait, 'disk': summary['disk'], 'send': summary['send']}
+            latency.record(summary['command'], timings, summary['bytes_in'], summary['bytes_out'])
+        if summary and summary['command'] != 'status':
+            with worker_lock:
+                worker_status['success'] += 1
+                worker_status['bytes_sent'] += summary['bytes_out']
+                worker_status['bytes_received'] += summary['bytes_in']
+                worker_status[operation_field(summary['command'])] += 1
     except Exception as e:
         logging.error(f"Error handling client {address}: {e}")
         with worker_lock:
@@ -50,39 +64,98 @@ def process_client_thread(connection, address):
         connection.close()
 
 
-
 class Server:
-    def __init__(self, ipaddress='0.0.0.0', port=6667, max_workers=10):
+    def __init__(self, ipaddress='0.0.0.0', port=6667, max_workers=10,
+                 metadata_share=METADATA_SHARE, queue_limit=QUEUE_LIMIT):
         self.ipinfo = (ipaddress, port)
         self.my_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.my_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.max_workers = max_workers
-        
+        self.scheduler = Scheduler(max_workers, metadata_share, queue_limit)
+        # Koneksi yang sudah di-accept tapi nama perintahnya belum terbaca
+        self.pending = 0
+        fp.status_providers['lanes'] = self.scheduler.stats
+
+    def workers(self):
+        return self.scheduler.workers
+
+    def control_workers(self, params):
+        # WORKERS <n>: jumlah thread dibagi ulang ke lane metadata dan bulk
+        # Minimal 2: satu thread per lane
+        count = worker_count(params, lowest=2)
+        self.scheduler.resize(count)
+        logging.warning(f"Jumlah worker diubah menjadi {self.scheduler.workers}")
+        return {'status': 'OK', 'workers': self.scheduler.workers}
+
+    def inflight(self):
+        return self.pending + self.scheduler.inflight()
+
+    def control_config(self, params):
+        return {'status': 'OK', 'workers': self.scheduler.workers, 'inflight': self.inflight(), **config.snapshot()}
+
+    def commands(self):
+        return {
+            'workers': self.control_workers, 'config': self.control_config,
+            'drain': lambda params: config.drain(self.inflight, params), **config.commands(),
+        }
+
     def run(self):
-        logging.warning(f"Server berjalan di {self.ipinfo} dengan max_workers={self.max_workers} dalam mode thread")
+        logging.warning(f"Server berjalan di {self.ipinfo} dengan max_workers={self.workers()} dalam mode thread")
         self.my_socket.bind(self.ipinfo)
         self.my_socket.listen(10)
 
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            try:
-                while True:
-                    connection, address = self.my_socket.accept()
-                    logging.warning(f"Accepted connection dari {address}")
-                    executor.submit(process_client_thread, connection, address)
-            except KeyboardInterrupt:
-                logging.warning("Server shutting down.")
-            finally:
-                self.my_socket.close()
-
-def send_server_workers(max_workers):
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.bind(('0.0.0.0', 6668))
-        s.listen()
-        while True:
-            conn, addr = s.accept()
-            with conn:
-                logging.warning(f"Sending max_workers to {addr}")
-                conn.sendall(max_workers.to_bytes(4, 'big'))
+        # Koneksi baru ditunggu di selector sampai nama perintahnya terbaca (MSG_PEEK),
+        # baru diserahkan ke lane yang sesuai; client lambat tidak menahan accept loop
+        selector = selectors.DefaultSelector()
+        selector.register(self.my_socket, selectors.EVENT_READ)
+        listening = True
+        try:
+            while True:
+                # Saat pause socket listen dilepas dari selector; koneksi baru menunggu di backlog kernel
+                if config.paused == listening:
+                    if listening:
+                        selector.unregister(self.my_socket)
+                    else:
+                        selector.register(self.my_socket, selectors.EVENT_READ)
+                    listening = not listening
+                self.pending = len(selector.get_map()) - listening
+                if not selector.get_map():
+                    # select() di Windows menolak daftar kosong
+                    time.sleep(POLL_INTERVAL)
+                    continue
+                for key, _ in selector.select(POLL_INTERVAL):
+                    if key.fileobj is self.my_socket:
+                        if config.paused:
+                            continue
+                        connection, address = self.my_socket.accept()
+                        logging.warning(f"Accepted connection dari {address}")
+                        connection.setblocking(False)
+                        selector.register(connection, selectors.EVENT_READ, address)
+                        continue
+                    connection, address = key.fileobj, key.data
+                    try:
+                        head = connection.recv(PEEK_SIZE, socket.MSG_PEEK)
+                    except BlockingIOError:
+                        continue
+                    except OSError:
+                        head = b''
+                    selector.unregister(connection)
+                    self.pending = len(selector.get_map()) - listening
+                    if not head:
+                        connection.close()
+                        continue
+                    connection.setblocking(True)
+                    self.scheduler.dispatch(head, process_client_thread, connection, address, time.monotonic())
+        except KeyboardInterrupt:
+            logging.warning("Server shutting down.")
+        finally:
+            selector.close()
+            self.my_socket.close()
+            self.scheduler.shutdown()
+
+def control_stats(params):
+    with worker_lock:
+        return {'status': 'OK', **worker_status}
 
 def main():
     logging.basicConfig(level=logging.WARNING)
@@ -93,10 +166,47 @@ def main():
         print("Input harus berupa angka.")
         return
 
-    # Jalankan thread untuk kirim max_workers di port 6668
-    threading.Thread(target=send_server_workers, args=(max_workers,), daemon=True).start()
+    try:
+        cache_mb = int(input("Masukkan budget cache GET dalam MB (default 256): "))
+        config.set('cache_budget', cache_mb * MB)
+    except Exception:
+        print("Menggunakan budget cache default")
+
+    if input("Aktifkan penyimpanan deduplikasi (content-addressed)? [y/N]: ").strip().lower() == 'y':
+        fp.file.dedup = True
+
+    try:
+        metadata_share = int(input("Persentase worker untuk lane metadata (default 20): ")) / 100
+    except ValueError:
+        metadata_share = METADATA_SHARE
+    try:
+        queue_limit = int(input(f"Batas antrian per lane sebelum BUSY (default {QUEUE_LIMIT}): "))
+    except ValueError:
+        queue_limit = QUEUE_LIMIT
+
+    limits = []
+    for prompt in ("per koneksi", "per IP client", "global"):
+        try:
+            limits.append(int(float(input(f"Batas bandwidth {prompt} dalam MB/s (0 = tanpa batas): ")) * MB))
+        except ValueError:
+            limits.append(0)
+    pacer.set_limits(*limits)
+    fp.status_providers['pacing'] = pacer.stats
+
+    # Tanpa batas autoscaler tetap dibuat tetapi nonaktif; bisa dinyalakan dengan AUTOSCALE on min=<n> max=<n>
+    bounds = input("Batas autoscaling worker 'min max' (kosong = jumlah worker tetap): ").split()
+    enabled = len(bounds) == 2 and all(b.isdigit() for b in bounds) and 2 <= int(bounds[0]) <= int(bounds[1])
+    minimum, maximum = (int(bounds[0]), int(bounds[1])) if enabled else (max_workers, max_workers)
 
-    svr = Server(SERVER_ADDRESS[0], SERVER_ADDRESS[1], max_workers=max_workers)
+    svr = Server(SERVER_ADDRESS[0], SERVER_ADDRESS[1], max_workers, metadata_share, queue_limit)
+    autoscaler = Autoscaler(svr.scheduler.load, svr.scheduler.resize, minimum, maximum, latency, enabled, lowest=2).start()
+    fp.status_providers['autoscaler'] = autoscaler.stats
+    # Jalankan thread untuk kirim jumlah worker (dan perintah admin) di port 6668
+    commands = {'stats': control_stats, 'pace': pacer.control, 'autoscale': autoscaler.control,
+                'profile': profiler.control, 'memory': memory_tracer.control, **svr.commands()}
+    profiler.follow()
+    memory_tracer.follow()
+    threading.Thread(target=serve_control, args=(svr.workers, commands), daemon=True).start()
     svr.run()
 
 if __name__ == "__main__":
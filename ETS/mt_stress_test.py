@@ -8,32 +8,39 @@ import os
 import glob
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+from file_client_cli import read_body
+
 SERVER_ADDRESS = ('172.16.16.101', 6667)
 CONTROL_PORT = 6668
 BUFFER_SIZE = 1024 * 1024
+TRANSFER_MODE = 'base64'
 
-def kirim_perintah(perintah=""):
+def kirim_perintah(perintah="", payload=None, sink=None):
     try:
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
             sock.connect(SERVER_ADDRESS)
             sock.sendall(perintah.encode())
+            if payload is not None:
+                sock.sendfile(payload)
 
-            data_diterima = ""
-            while True:
-                data = sock.recv(BUFFER_SIZE)
-                if not data:
-                    break
-                data_diterima += data.decode()
-                if "\r\n\r\n" in data_diterima:
-                    break
+            with sock.makefile('rb') as stream:
+                hasil = json.loads(stream.readline())
+                if hasil.get('data_framing'):
+                    stream.readline()
+                    read_body(stream, hasil, sink)
 
-        return json.loads(data_diterima)
+        return hasil
     except Exception as e:
         logging.error(f"[CLIENT ERROR] {e}")
         return {"status": "ERROR", "data": str(e)}
 
 def unggah_file_ke_server(nama_file):
     try:
+        if TRANSFER_MODE == 'binary':
+            with open(nama_file, 'rb') as f:
+                ukuran = os.fstat(f.fileno()).st_size
+                hasil = kirim_perintah(f"POSTRAW {nama_file} {ukuran}\r\n\r\n", payload=f)
+            return hasil.get('status') == 'OK'
         with open(nama_file, 'rb') as f:
             isi_encoded = base64.b64encode(f.read()).decode()
         perintah = f"POST {nama_file} {isi_encoded}\r\n\r\n"
@@ -44,11 +51,18 @@ def unggah_file_ke_server(nama_file):
 
 def unduh_file_dari_server(nama_file):
     try:
-        perintah = f"GET {nama_file}\r\n\r\n"
-        hasil = kirim_perintah(perintah)
         ekstensi = nama_file.split('.')[-1]
         nama_baru = f"{nama_file.split('.')[0]}_{time.time()}.{ekstensi}"
 
+        if TRANSFER_MODE == 'binary':
+            with open(nama_baru, 'wb') as f:
+                hasil = kirim_perintah(f"GETRAW {nama_file}\r\n\r\n", sink=f)
+            os.remove(nama_baru)
+            return hasil.get('status') == 'OK'
+
+        perintah = f"GET {nama_file}\r\n\r\n"
+        hasil = kirim_perintah(perintah)
+
         if hasil.get('status') == 'OK' and 'data_file' in hasil:
             with open(nama_baru, 'wb') as f:
                 f.write(base64.b64decode(hasil['data_file']))
@@ -102,9 +116,44 @@ def uji_stres(operasi, ukuran, jumlah_client):
 
     return hasil_uji
 
+def hitung_fairness(daftar_throughput):
+    # Jain's fairness index: 1 berarti semua client mendapat throughput yang sama, 1/n berarti satu client mendominasi
+    if not daftar_throughput:
+        return "-", "-", "-"
+    jumlah = sum(daftar_throughput)
+    kuadrat = sum(t * t for t in daftar_throughput)
+    indeks = round(jumlah * jumlah / (len(daftar_throughput) * kuadrat), 4) if kuadrat > 0 else "-"
+    return min(daftar_throughput), max(daftar_throughput), indeks
+
+
+def siapkan_csv(nama_file, kolom):
+    # File hasil dengan header lama (mis. sebelum kolom fairness ditambahkan) dipindah ke nama lain,
+    # supaya baris baru tidak ditulis di bawah header dengan jumlah kolom berbeda.
+    # Mengembalikan True jika file dengan header yang sama sudah ada
+    if not os.path.isfile(nama_file):
+        return False
+    with open(nama_file, newline='') as f:
+        header = next(csv.reader(f), None)
+    if header == kolom:
+        return True
+    nama_lama = f"{os.path.splitext(nama_file)[0]}_lama_{time.strftime('%Y%m%d_%H%M%S')}.csv"
+    os.replace(nama_file, nama_lama)
+    print(f"Kolom {nama_file} berbeda, hasil lama dipindah ke {nama_lama}")
+    return False
+
+
 def simpan_ke_csv(hasil, operasi, ukuran, jumlah_client, jumlah_server_worker):
     nama_file_csv = 'stress_test_results_multithreading.csv'
-    sudah_ada = os.path.isfile(nama_file_csv)
+    if TRANSFER_MODE == 'binary':
+        nama_file_csv = 'stress_test_results_multithreading_binary.csv'
+    kolom = [
+        'No', 'Operation', 'Volume', 'Client Workers', 'Server Workers',
+        'Average Time (s)', 'Average Throughput (bytes/s)',
+        'Success Clients', 'Failed Clients',
+        'Success Server Workers', 'Failed Server Workers',
+        'Min Throughput (bytes/s)', 'Max Throughput (bytes/s)', 'Fairness Index'
+    ]
+    sudah_ada = siapkan_csv(nama_file_csv, kolom)
 
     jumlah_sukses = sum(1 for h in hasil if h['status'])
     jumlah_gagal = len(hasil) - jumlah_sukses
@@ -114,17 +163,13 @@ def simpan_ke_csv(hasil, operasi, ukuran, jumlah_client, jumlah_server_worker):
 
     rata_rata_waktu = round(total_durasi / jumlah_sukses, 4) if jumlah_sukses > 0 else "-"
     rata_rata_throughput = round(total_throughput / jumlah_sukses, 4) if jumlah_sukses > 0 and operasi != "list" else "-"
+    throughput_min, throughput_max, fairness = hitung_fairness(
+        [h['throughput'] for h in hasil if h['status'] and h['throughput'] != "-"])
 
     sukses_server = jumlah_server_worker if jumlah_gagal == 0 else 0
     gagal_server = 0 if sukses_server > 0 else jumlah_server_worker
 
     with open(nama_file_csv, 'a', newline='') as csvfile:
-        kolom = [
-            'No', 'Operation', 'Volume', 'Client Workers', 'Server Workers',
-            'Average Time (s)', 'Average Throughput (bytes/s)',
-            'Success Clients', 'Failed Clients',
-            'Success Server Workers', 'Failed Server Workers'
-        ]
         penulis = csv.DictWriter(csvfile, fieldnames=kolom)
 
         if not sudah_ada:
@@ -147,7 +192,10 @@ def simpan_ke_csv(hasil, operasi, ukuran, jumlah_client, jumlah_server_worker):
             'Success Clients': jumlah_sukses,
             'Failed Clients': jumlah_gagal,
             'Success Server Workers': sukses_server,
-            'Failed Server Workers': gagal_server
+            'Failed Server Workers': gagal_server,
+            'Min Throughput (bytes/s)': throughput_min,
+            'Max Throughput (bytes/s)': throughput_max,
+            'Fairness Index': fairness
         })
 
 if __name__ == '__main__':
@@ -158,6 +206,9 @@ if __name__ == '__main__':
         data = kontrol_socket.recv(1024)
         jumlah_server_worker = int.from_bytes(data, byteorder='big')
 
+    if input("Mode transfer: [1] base64 [2] biner: ").strip() == '2':
+        TRANSFER_MODE = 'binary'
+
     mode = input("Pilih mode: [1] Semua kombinasi [2] Input manual: ")
 
     if mode == '1':
@@ -0,0 +1,135 @@
+import math
+import time
+import threading
+
+MB = 1024 * 1024
+# Ukuran potongan send/recv saat pacing aktif; makin kecil makin halus pembagiannya
+QUANTUM = 64 * 1024
+# Bucket boleh menampung token untuk sekian detik transfer (burst)
+BURST_SECONDS = 0.25
+
+
+class TokenBucket:
+    # rate dalam byte/detik; 0 berarti tanpa batas. Token boleh minus (utang) lalu pemanggil tidur sampai lunas
+    def __init__(self, rate=0):
+        self.lock = threading.Lock()
+        self.rate = 0
+        self.burst = 0
+        self.tokens = 0
+        self.stamp = time.monotonic()
+        self.set_rate(rate)
+
+    def set_rate(self, rate):
+        with self.lock:
+            self.rate = rate
+            self.burst = max(rate * BURST_SECONDS, QUANTUM)
+            self.tokens = min(self.tokens, self.burst)
+
+    def reserve(self, amount):
+        # Kembalikan lama tunggu (detik) sebelum amount byte boleh dikirim/diterima
+        with self.lock:
+            if not self.rate:
+                return 0
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+            self.tokens -= amount
+            return -self.tokens / self.rate if self.tokens < 0 else 0
+
+
+class ConnectionPacer:
+    # Dipakai FileProtocol.serve: setiap potongan data harus lolos bucket koneksi, IP dan global
+    def __init__(self, pacer, ip):
+        self.pacer = pacer
+        self.ip = ip
+        self.quantum = QUANTUM
+        self.bucket = TokenBucket(pacer.limits['connection'])
+        self.buckets = None
+
+    def __enter__(self):
+        self.buckets = [self.bucket, self.pacer.acquire_ip(self), self.pacer.total]
+        return self
+
+    def __exit__(self, *exc):
+        self.pacer.release_ip(self)
+
+    @property
+    def active(self):
+        return any(bucket.rate for bucket in self.buckets)
+
+    def throttle(self, amount):
+        # Tunggu yang paling lama di antara ketiga bucket; semuanya sudah dipotong sekaligus
+        wait = max(bucket.reserve(amount) for bucket in self.buckets)
+        if wait > 0:
+            time.sleep(wait)
+
+
+class Pacer:
+    """
+    Pembatas bandwidth dengan token bucket per koneksi, per IP client dan
+    global, berlaku untuk arah kirim maupun terima. Batas bisa diubah saat
+    server berjalan; perubahan langsung berlaku untuk koneksi yang aktif.
+    """
+    def __init__(self, connection=0, ip=0, total=0):
+        self.lock = threading.Lock()
+        self.limits = {'connection': connection, 'ip': ip, 'global': total}
+        self.total = TokenBucket(total)
+        self.ips = {}
+        self.connections = set()
+
+    def connection(self, ip):
+        return ConnectionPacer(self, ip)
+
+    def acquire_ip(self, conn):
+        with self.lock:
+            self.connections.add(conn)
+            entry = self.ips.get(conn.ip)
+            if entry is None:
+                entry = self.ips[conn.ip] = [TokenBucket(self.limits['ip']), 0]
+            entry[1] += 1
+            return entry[0]
+
+    def release_ip(self, conn):
+        with self.lock:
+            self.connections.discard(conn)
+            entry = self.ips[conn.ip]
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self.ips[conn.ip]
+
+    def set_limits(self, connection=None, ip=None, total=None):
+        with self.lock:
+            if connection is not None:
+                self.limits['connection'] = connection
+                for conn in self.connections:
+                    conn.bucket.set_rate(connection)
+            if ip is not None:
+                self.limits['ip'] = ip
+                for bucket, _ in self.ips.values():
+                    bucket.set_rate(ip)
+            if total is not None:
+                self.limits['global'] = total
+                self.total.set_rate(total)
+
+    def control(self, params):
+        # PACE [connection=MB/s] [ip=MB/s] [global=MB/s]; 0 berarti tanpa batas
+        options = dict(p.split('=', 1) for p in params if '=' in p)
+        unknown = set(options) - {'connection', 'ip', 'global'}
+        if unknown:
+            raise ValueError(f"opsi pacing tidak dikenal: {', '.join(sorted(unknown))}")
+        rates = {}
+        for key, value in options.items():
+            rate = float(value)
+            if not math.isfinite(rate) or rate < 0:
+                raise ValueError(f'batas {key} harus angka tidak negatif')
+            rates[key] = int(rate * MB)
+        self.set_limits(rates.get('connection'), rates.get('ip'), rates.get('global'))
+        return {'status': 'OK', **self.stats()}
+
+    def stats(self):
+        with self.lock:
+            return {
+                'limits_mbps': {key: value / MB for key, value in self.limits.items()},
+                'connections': len(self.connections),
+                'ips': len(self.ips),
+            }
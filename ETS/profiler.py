@@ -0,0 +1,155 @@
+import os
+import sys
+import shutil
+import time
+import logging
+import threading
+import multiprocessing
+from collections import Counter
+
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles')
+# Interval sampling default (milidetik); 10 ms = 100 sampel per detik per proses
+DEFAULT_INTERVAL_MS = 10
+# Seberapa sering thread sampler memeriksa perintah PROFILE saat tidak sedang sampling
+FOLLOW_INTERVAL = 0.2
+TOP_FUNCTIONS = 10
+# Ringkasan top tidak menghitung thread yang sedang menunggu (leaf fungsi blocking) dan thread housekeeping;
+# file .folded tetap berisi semua stack
+IDLE_FUNCTIONS = {'wait', 'select', 'accept', 'sleep'}
+HOUSEKEEPING_THREADS = {'autoscaler', 'profiler', 'memtrace'}
+
+
+def frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse(frame):
+    # Stack dari root ke leaf, dipisah ';' seperti format collapsed flamegraph.pl
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class StackSampler:
+    """
+    Sampler stack dengan membaca sys._current_frames() dari thread latar
+    setiap interval. Tidak butuh signal maupun cProfile, jadi overhead saat
+    sampling hanya sebanding dengan jumlah thread, dan nol saat berhenti.
+    Hasilnya counter per stack: "<proses>;<thread>;<frame>;... <jumlah>".
+    """
+    def __init__(self):
+        self.stacks = Counter()
+        self.samples = 0
+
+    def sample(self):
+        names = {t.ident: t.name for t in threading.enumerate()}
+        process = multiprocessing.current_process().name
+        me = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            self.stacks[f"{process};{names.get(ident, ident)};{collapse(frame)}"] += 1
+        self.samples += 1
+
+    def write(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.items():
+                f.write(f"{stack} {count}\n")
+
+
+class Profiler:
+    """
+    Profiler yang dinyalakan lewat port kontrol (PROFILE start/stop/status).
+    Status sesi disimpan di RuntimeConfig sehingga setiap proses worker
+    mp_server melihatnya; tiap proses menjalankan follow() yang mulai
+    sampling saat sesi dibuka dan menulis file per pid saat sesi ditutup.
+    Proses yang menerima PROFILE stop menggabungkannya menjadi satu file.
+    """
+    def __init__(self, config, directory=PROFILE_DIR):
+        self.config = config
+        self.directory = directory
+        self.started = None
+
+    def session_dir(self, session):
+        return os.path.join(self.directory, f"session-{session}")
+
+    def follow(self):
+        threading.Thread(target=self._follow, name='profiler', daemon=True).start()
+
+    def _follow(self):
+        session, sampler = 0, None
+        while True:
+            current = self.config.get('profile_session')
+            if current != session:
+                if sampler is not None:
+                    sampler.write(os.path.join(self.session_dir(session), f"{os.getpid()}.folded"))
+                session, sampler = current, StackSampler() if current else None
+            if sampler is None:
+                time.sleep(FOLLOW_INTERVAL)
+                continue
+            try:
+                sampler.sample()
+            except Exception as e:
+                logging.error(f"Error di profiler: {e}")
+            time.sleep(self.config.get('profile_interval') / 1e6)
+
+    def control(self, params):
+        # PROFILE start [interval ms] | PROFILE stop | PROFILE status
+        action = params[0].lower() if params else 'status'
+        session = self.config.get('profile_session')
+        if action == 'start':
+            if session:
+                raise ValueError('profiler sudah berjalan')
+            interval_ms = float(params[1]) if len(params) > 1 else DEFAULT_INTERVAL_MS
+            if interval_ms <= 0:
+                raise ValueError('interval harus lebih dari 0')
+            self.config.set('profile_interval', int(interval_ms * 1000))
+            self.config.set('profile_session', int(time.time() * 1000))
+            self.started = time.time()
+            logging.warning(f"Profiler dimulai dengan interval {interval_ms} ms")
+            return {'status': 'OK', 'profiling': True, 'interval_ms': interval_ms}
+        if action == 'stop':
+            if not session:
+                raise ValueError('profiler tidak sedang berjalan')
+            self.config.set('profile_session', 0)
+            # Beri waktu setiap proses menyelesaikan sampel terakhir dan menulis filenya
+            time.sleep(FOLLOW_INTERVAL * 2 + self.config.get('profile_interval') / 1e6)
+            return {'status': 'OK', 'profiling': False, **self.merge(session)}
+        if action == 'status':
+            return {'status': 'OK', 'profiling': bool(session),
+                    'seconds': round(time.time() - self.started, 3) if session and self.started else None}
+        raise ValueError(f"perintah profile tidak dikenal: {action}")
+
+    def merge(self, session):
+        stacks = Counter()
+        directory = self.session_dir(session)
+        processes = 0
+        for name in sorted(os.listdir(directory)) if os.path.isdir(directory) else []:
+            processes += 1
+            with open(os.path.join(directory, name)) as f:
+                for line in f:
+                    stack, _, count = line.rstrip('\n').rpartition(' ')
+                    stacks[stack] += int(count)
+        shutil.rmtree(directory, ignore_errors=True)
+        path = os.path.join(self.directory, f"profile-{session}.folded")
+        os.makedirs(self.directory, exist_ok=True)
+        with open(path, 'w') as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        # Fungsi dengan sampel terbanyak sebagai leaf (self time), supaya ringkasannya terlihat tanpa flame graph
+        leaves = Counter()
+        for stack, count in stacks.items():
+            thread = stack.split(';', 2)[1]
+            leaf = stack.rsplit(';', 1)[-1]
+            if thread not in HOUSEKEEPING_THREADS and leaf.split(' ', 1)[0] not in IDLE_FUNCTIONS:
+                leaves[leaf] += count
+        logging.warning(f"Profiler berhenti, hasil di {path}")
+        return {
+            'file': path,
+            'processes': processes,
+            'samples': sum(stacks.values()),
+            'top': [{'function': name, 'samples': count} for name, count in leaves.most_common(TOP_FUNCTIONS)],
+        }
@@ -0,0 +1,124 @@
+import time
+import logging
+import threading
+import multiprocessing
+
+MB = 1024 * 1024
+DRAIN_TIMEOUT = 30
+# Jeda setelah pause sebelum menghitung request aktif, untuk accept yang sedang berjalan
+DRAIN_GRACE = 0.3
+# Batas atas nilai dari port kontrol (tanpa autentikasi): nilai ekstrem ditolak, bukan dicoba dialokasikan
+MAX_WORKERS = 256
+MAX_BUFFER_SIZE = 64 * MB
+# profile_session/memory_session 0 berarti mati; selain itu id sesi PROFILE/MEMORY yang sedang berjalan
+FIELDS = ('generation', 'buffer_size', 'cache_budget', 'paused', 'profile_session', 'profile_interval',
+          'memory_session', 'memory_frames', 'memory_snapshot')
+INDEX = {name: i for i, name in enumerate(FIELDS)}
+
+
+def worker_count(params, lowest=1, highest=MAX_WORKERS):
+    # Argumen WORKERS <n> yang sudah dicek batas bawah dan atasnya
+    count = int(params[0])
+    if count < lowest:
+        raise ValueError(f'jumlah worker minimal {lowest}')
+    if count > highest:
+        raise ValueError(f'jumlah worker maksimal {highest}')
+    return count
+
+
+class RuntimeConfig:
+    """
+    Konfigurasi yang bisa diubah lewat port kontrol tanpa restart server.
+    Nilainya disimpan di RawArray yang dibuat sebelum fork, jadi worker
+    mp_server ikut melihat perubahan; hanya proses induk yang menulis.
+    Setiap perubahan menaikkan generation, dan apply() di worker cukup
+    membandingkan satu angka sebelum menerapkan ulang cache budget.
+    """
+    def __init__(self, buffer_size, cache_budget):
+        self.values = multiprocessing.RawArray('q', len(FIELDS))
+        self.values[INDEX['buffer_size']] = buffer_size
+        self.values[INDEX['cache_budget']] = cache_budget
+        self.lock = threading.Lock()
+        self.seen = 0
+
+    @property
+    def buffer_size(self):
+        return self.values[INDEX['buffer_size']]
+
+    @property
+    def cache_budget(self):
+        return self.values[INDEX['cache_budget']]
+
+    @property
+    def paused(self):
+        return bool(self.values[INDEX['paused']])
+
+    def get(self, field):
+        return self.values[INDEX[field]]
+
+    def set(self, field, value):
+        with self.lock:
+            self.values[INDEX[field]] = value
+            self.values[INDEX['generation']] += 1
+
+    def apply(self, fp):
+        # Dipanggil worker sebelum melayani request
+        generation = self.values[INDEX['generation']]
+        if generation != self.seen:
+            self.seen = generation
+            fp.file.cache.set_budget(self.cache_budget)
+
+    def snapshot(self):
+        return {
+            'buffer_size': self.buffer_size,
+            'cache_budget_mb': self.cache_budget / MB,
+            'paused': self.paused,
+            'profiling': bool(self.get('profile_session')),
+            'memory_tracing': bool(self.get('memory_session')),
+        }
+
+    def control_buffer(self, params):
+        # BUFFER <byte>
+        size = int(params[0])
+        if size <= 0:
+            raise ValueError('ukuran buffer harus lebih dari 0')
+        if size > MAX_BUFFER_SIZE:
+            raise ValueError(f'ukuran buffer maksimal {MAX_BUFFER_SIZE} byte')
+        self.set('buffer_size', size)
+        return {'status': 'OK', **self.snapshot()}
+
+    def control_cache(self, params):
+        # CACHE <MB>
+        budget = int(float(params[0]) * MB)
+        if budget < 0:
+            raise ValueError('budget cache tidak boleh negatif')
+        self.set('cache_budget', budget)
+        return {'status': 'OK', **self.snapshot()}
+
+    def control_pause(self, params):
+        self.set('paused', 1)
+        logging.warning("Server di-pause, koneksi baru tidak di-accept")
+        return {'status': 'OK', **self.snapshot()}
+
+    def control_resume(self, params):
+        self.set('paused', 0)
+        logging.warning("Server dilanjutkan")
+        return {'status': 'OK', **self.snapshot()}
+
+    def drain(self, inflight, params):
+        # DRAIN [detik]: pause lalu tunggu sampai inflight() (request yang sudah diterima) habis
+        timeout = float(params[0]) if params else DRAIN_TIMEOUT
+        self.control_pause(params)
+        time.sleep(DRAIN_GRACE)
+        deadline = time.monotonic() + timeout
+        while inflight():
+            if time.monotonic() >= deadline:
+                return {'status': 'ERROR', 'data': 'drain timeout', 'inflight': inflight()}
+            time.sleep(0.05)
+        return {'status': 'OK', 'inflight': 0, **self.snapshot()}
+
+    def commands(self):
+        return {
+            'buffer': self.control_buffer, 'cache': self.control_cache,
+            'pause': self.control_pause, 'resume': self.control_resume,
+        }
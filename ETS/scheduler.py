@@ -0,0 +1,164 @@
+import json
+import socket
+import logging
+import threading
+from collections import deque
+
+TERMINATOR = b"\r\n\r\n"
+# Perintah murah yang tidak boleh mengantre di belakang transfer besar
+METADATA_COMMANDS = {'list', 'status', 'delete', 'posthash'}
+METADATA_SHARE = 0.2
+QUEUE_LIMIT = 64
+RETRY_AFTER = 1
+DISCARD_SIZE = 64 * 1024
+
+
+def classify(head):
+    # head: beberapa byte awal request (hasil MSG_PEEK), cukup untuk membaca nama perintah
+    command = head.split(b' ', 1)[0].split(b'\r', 1)[0].strip().lower()
+    return 'metadata' if command.decode(errors='replace') in METADATA_COMMANDS else 'bulk'
+
+
+def busy_response(lane, retry_after=RETRY_AFTER):
+    return json.dumps({
+        'status': 'ERROR', 'code': 'BUSY', 'lane': lane, 'retry_after': retry_after,
+        'data': f'server sibuk (antrian {lane} penuh), coba lagi'
+    }).encode() + TERMINATOR
+
+
+class Lane:
+    """
+    Kumpulan thread worker dengan antrian terbatas: submit() menolak jika
+    sudah ada limit tugas yang menunggu. Jumlah thread bisa diubah saat
+    berjalan; thread yang berlebih berhenti setelah tugasnya selesai.
+    """
+    def __init__(self, name, workers, limit=QUEUE_LIMIT):
+        self.name = name
+        self.limit = limit
+        self.cond = threading.Condition()
+        self.tasks = deque()
+        self.threads = 0
+        self.target = 0
+        self.active = 0
+        self.rejected = 0
+        self.resize(workers)
+
+    @property
+    def workers(self):
+        return self.target
+
+    @property
+    def queued(self):
+        return len(self.tasks)
+
+    def resize(self, workers):
+        with self.cond:
+            self.target = max(0, workers)
+            while self.threads < self.target:
+                self.threads += 1
+                threading.Thread(target=self._worker, name=f'lane-{self.name}', daemon=True).start()
+            self.cond.notify_all()
+
+    def submit(self, fn, *args):
+        with self.cond:
+            if len(self.tasks) >= self.limit:
+                self.rejected += 1
+                return False
+            self.tasks.append((fn, args))
+            self.cond.notify()
+        return True
+
+    def _worker(self):
+        while True:
+            with self.cond:
+                while not self.tasks and self.threads <= self.target:
+                    self.cond.wait()
+                if self.threads > self.target:
+                    self.threads -= 1
+                    return
+                fn, args = self.tasks.popleft()
+                self.active += 1
+            try:
+                fn(*args)
+            except Exception as e:
+                logging.error(f"Error di lane {self.name}: {e}")
+            finally:
+                with self.cond:
+                    self.active -= 1
+
+    def stats(self):
+        with self.cond:
+            return {'workers': self.target, 'queued': len(self.tasks), 'active': self.active,
+                    'limit': self.limit, 'rejected': self.rejected}
+
+    def shutdown(self):
+        self.resize(0)
+
+
+class Scheduler:
+    """
+    Membagi worker menjadi lane metadata (LIST, STATUS, DELETE, ...) dan
+    lane bulk (GET, POST, MGET, ...). Masing-masing punya thread dan
+    antrian sendiri, sehingga LIST tidak menunggu di belakang upload besar.
+    Jika antrian lane penuh, koneksi langsung dijawab BUSY lalu ditutup.
+    """
+    def __init__(self, max_workers, metadata_share=METADATA_SHARE, queue_limit=QUEUE_LIMIT):
+        self.metadata_share = metadata_share
+        metadata_workers, bulk_workers = self.split(max_workers)
+        self.lanes = {
+            'metadata': Lane('metadata', metadata_workers, queue_limit),
+            'bulk': Lane('bulk', bulk_workers, queue_limit),
+        }
+
+    def split(self, max_workers):
+        metadata_workers = max(1, round(max_workers * self.metadata_share))
+        return metadata_workers, max(1, max_workers - metadata_workers)
+
+    @property
+    def workers(self):
+        return sum(lane.workers for lane in self.lanes.values())
+
+    def resize(self, max_workers):
+        metadata_workers, bulk_workers = self.split(max_workers)
+        self.lanes['metadata'].resize(metadata_workers)
+        self.lanes['bulk'].resize(bulk_workers)
+
+    def inflight(self):
+        return sum(lane.queued + lane.active for lane in self.lanes.values())
+
+    def load(self):
+        # Dipakai autoscaler: jumlah thread, yang sedang bekerja, dan tugas yang menunggu
+        return {
+            'workers': self.workers,
+            'busy': sum(lane.active for lane in self.lanes.values()),
+            'queued': sum(lane.queued for lane in self.lanes.values()),
+        }
+
+    def dispatch(self, head, fn, connection, address, *args):
+        lane = classify(head)
+        if self.lanes[lane].submit(fn, connection, address, *args):
+            return True
+        logging.warning(f"Lane {lane} penuh, menolak {address}")
+        try:
+            # Buang request yang sudah tiba; menutup socket dengan data belum dibaca membuat kernel
+            # mengirim RST dan client bisa kehilangan jawaban BUSY
+            connection.setblocking(False)
+            try:
+                connection.recv(DISCARD_SIZE)
+            except BlockingIOError:
+                pass
+            connection.setblocking(True)
+            connection.sendall(busy_response(lane))
+            connection.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+        finally:
+            connection.close()
+        return False
+
+    def stats(self):
+        return {name: lane.stats() for name, lane in self.lanes.items()}
+
+    def shutdown(self):
+        for lane in self.lanes.values():
+            lane.shutdown()
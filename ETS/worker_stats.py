@@ -0,0 +1,124 @@
+import os
+import multiprocessing
+from multiprocessing import shared_memory
+
+OPERATIONS = ('list', 'get', 'post', 'delete', 'getraw', 'postraw', 'posthash', 'mget', 'signature', 'delta')
+# active adalah gauge (naik saat request mulai, turun saat selesai), dipakai DRAIN untuk menunggu worker
+FIELDS = ('success', 'fail', 'bytes_sent', 'bytes_received', 'active') + tuple(f'op_{op}' for op in OPERATIONS) + ('op_other',)
+INDEX = {name: i for i, name in enumerate(FIELDS)}
+
+
+def operation_field(command):
+    return f'op_{command}' if command in OPERATIONS else 'op_other'
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SlotCounters:
+    """
+    Deretan counter int64 dengan satu baris (slot) per proses worker.
+    Setiap proses hanya menulis ke slotnya sendiri sehingga update tidak
+    butuh lock maupun IPC; pembacaan menjumlahkan semua slot.
+    Jika shared, blok dibuat di shared memory sebelum fork agar worker
+    mewarisi mapping yang sama; jika tidak, cukup satu slot di memori proses.
+    Layout: [pid pemilik slot] * slots, lalu [width counter] * slots.
+    """
+    def __init__(self, width, slots=1, shared=True):
+        self.slots = slots
+        self.width = width
+        size = 8 * slots * (1 + width)
+        if shared:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self.values = self.shm.buf.cast('q')
+        else:
+            self.shm = None
+            self.values = memoryview(bytearray(size)).cast('q')
+        # Lock hanya dipakai sekali per proses saat mengklaim slot, bukan untuk setiap update
+        self.claim_lock = multiprocessing.Lock()
+        self.slot_pid = None
+        self.base = None
+
+    def _slot_base(self):
+        pid = os.getpid()
+        if self.slot_pid != pid:
+            self.base = self.slots + self._claim(pid) * self.width
+            self.slot_pid = pid
+        return self.base
+
+    def _claim(self, pid):
+        with self.claim_lock:
+            free = None
+            for i in range(self.slots):
+                owner = self.values[i]
+                if owner == pid:
+                    return i
+                if free is None and (owner == 0 or not pid_alive(owner)):
+                    free = i
+            if free is None:
+                # Semua slot dipegang proses hidup; berbagi slot hanya membuat update tidak lagi atomik
+                return pid % self.slots
+            # Counter slot worker yang sudah mati tetap dipakai supaya total tidak berkurang
+            self.values[free] = pid
+            return free
+
+    def totals(self, start=0, count=None):
+        # Jumlah counter [start, start+count) dari semua slot
+        count = self.width - start if count is None else count
+        result = [0] * count
+        for i in range(self.slots):
+            base = self.slots + i * self.width + start
+            result = list(map(int.__add__, result, self.values[base:base + count].tolist()))
+        return result
+
+    def maxima(self, start=0, count=None):
+        # Seperti totals(), tetapi nilai terbesar antar slot (untuk counter puncak)
+        count = self.width - start if count is None else count
+        result = [0] * count
+        for i in range(self.slots):
+            base = self.slots + i * self.width + start
+            result = list(map(max, result, self.values[base:base + count].tolist()))
+        return result
+
+    def close(self, unlink=False):
+        self.values.release()
+        if self.shm is not None:
+            self.shm.close()
+            if unlink:
+                self.shm.unlink()
+
+
+class WorkerStats(SlotCounters):
+    # Counter success/fail/bytes dan jumlah request per operasi untuk mp_server
+    def __init__(self, slots):
+        super().__init__(len(FIELDS), slots)
+
+    def add(self, field, amount=1):
+        self.values[self._slot_base() + INDEX[field]] += amount
+
+    def record(self, summary):
+        base = self._slot_base()
+        self.values[base + INDEX['success']] += 1
+        self.values[base + INDEX['bytes_sent']] += summary['bytes_out']
+        self.values[base + INDEX['bytes_received']] += summary['bytes_in']
+        self.values[base + INDEX[operation_field(summary['command'])]] += 1
+
+    def __getitem__(self, field):
+        index = self.slots + INDEX[field]
+        return sum(self.values[index + i * self.width] for i in range(self.slots))
+
+    def get(self, field, default=0):
+        return self[field] if field in INDEX else default
+
+    def keys(self):
+        return FIELDS
+
+    def items(self):
+        return [(field, self[field]) for field in FIELDS]
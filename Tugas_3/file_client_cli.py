@@ -4,6 +4,8 @@ import base64
 import json
 import logging
 
+from frame_reader import FrameReader
+
 # Alamat server
 server_address = ('172.25.231.123', 6666)
 
@@ -15,20 +17,9 @@ def send_command(command_str=""):
     logging.warning(f"connecting to {server_address}")
     try:
         logging.warning(f"sending message ")
-        sock.sendall(command_str.encode())
-        # Look for the response, waiting until socket is done (no more data)
-        data_received="" #empty string
-        while True:
-            #socket does not receive all data at once, data comes in part, need to be concatenated at the end of process
-            data = sock.recv(4096)
-            if data:
-                #data is not empty, concat with previous content
-                data_received += data.decode()
-                if "\r\n\r\n" in data_received:
-                    break
-            else:
-                # no more data, stop the process by break
-                break
+        sock.sendall(command_str.encode() + b"\r\n\r\n")
+        # Response dikumpulkan sebagai bytes sampai "\r\n\r\n"; terminator hanya dicari di data yang baru masuk
+        data_received = FrameReader(sock).read_frame().decode()
         # at this point, data_received (string) will contain all data coming from the socket
         # to be able to use the data_received as a dict, need to load it using json.loads()
         hasil = json.loads(data_received)
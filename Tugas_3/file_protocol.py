@@ -18,16 +18,42 @@ string
 
 
 
+# Request yang parameter terakhirnya isi file base64; payload tidak ikut di-shlex
+PAYLOAD_REQUESTS = {b'upload'}
+# Panjang request yang ditulis ke log, supaya UPLOAD tidak mencetak seluruh isi file
+LOG_PREVIEW = 100
+
+
+def pisah_request(datamasuk):
+    """
+    Memisahkan request menjadi method dan params. Untuk UPLOAD hanya method
+    dan nama file yang dipecah; isi file dikembalikan sebagai memoryview
+    tanpa disalin maupun di-scan, jadi biayanya tetap walau file besar.
+    Request lain (dan nama file bertanda kutip) tetap memakai shlex.
+    """
+    if isinstance(datamasuk, str):
+        datamasuk = datamasuk.encode()
+    datamasuk = datamasuk.lstrip() if datamasuk[:1].isspace() else datamasuk
+    akhir_method = datamasuk.find(b' ')
+    akhir_nama = datamasuk.find(b' ', akhir_method + 1) if akhir_method >= 0 else -1
+    if (akhir_nama < 0 or datamasuk[:akhir_method].lower() not in PAYLOAD_REQUESTS
+            or datamasuk[akhir_method + 1:akhir_method + 2] in (b'"', b"'")):
+        c = shlex.split(datamasuk.decode())  # JANGAN pakai .lower()
+        return c[0].strip().lower(), c[1:]   # HANYA method yang dilower
+    c_request = datamasuk[:akhir_method].decode().lower()
+    filename = datamasuk[akhir_method + 1:akhir_nama].decode()
+    return c_request, [filename, memoryview(datamasuk)[akhir_nama + 1:]]
+
+
 class FileProtocol:
     def __init__(self):
         self.file = FileInterface()
     def proses_string(self,string_datamasuk=''):
-        logging.warning(f"string diproses: {string_datamasuk}")
+        # string_datamasuk boleh str atau bytes (server mengirim bytes apa adanya)
+        logging.warning(f"string diproses: {string_datamasuk[:LOG_PREVIEW]!r}")
         try:
-            c = shlex.split(string_datamasuk)  # JANGAN pakai .lower()
-            c_request = c[0].strip().lower()   # HANYA method yang dilower
+            c_request, params = pisah_request(string_datamasuk)
             logging.warning(f"memproses request: {c_request}")
-            params = [x for x in c[1:]]
             cl = getattr(self.file, c_request)(params)
             return json.dumps(cl)
         except Exception as e:
@@ -7,6 +7,7 @@ import sys
 
 
 from file_protocol import  FileProtocol
+from frame_reader import FrameReader
 fp = FileProtocol()
 
 
@@ -17,11 +18,13 @@ class ProcessTheClient(threading.Thread):
         threading.Thread.__init__(self)
 
     def run(self):
+        # Setiap request diakhiri "\r\n\r\n", jadi UPLOAD yang lebih besar dari satu recv tetap utuh
+        reader = FrameReader(self.connection)
         while True:
-            data = self.connection.recv(4096)
-            if data:
-                d = data.decode()
-                hasil = fp.proses_string(d)
+            data = reader.read_frame()
+            if data is not None:
+                # bytes diteruskan tanpa decode; isi file UPLOAD tidak perlu diubah ke str
+                hasil = fp.proses_string(data)
                 hasil=hasil+"\r\n\r\n"
                 self.connection.sendall(hasil.encode())
             else:
@@ -0,0 +1,64 @@
+import threading
+from contextlib import contextmanager
+
+TERMINATOR = b"\r\n\r\n"
+RECV_SIZE = 64 * 1024
+# Jumlah buffer bebas yang disimpan pool
+POOL_LIMIT = 16
+
+
+class BufferPool:
+    """
+    Kumpulan bytearray untuk recv_into yang dipakai bergantian oleh semua
+    thread, supaya setiap recv tidak membuat objek bytes baru. Jika pool
+    kosong dibuat buffer baru; buffer hanya disimpan selama pool belum penuh.
+    """
+    def __init__(self, size=RECV_SIZE, limit=POOL_LIMIT):
+        self.lock = threading.Lock()
+        self.size = size
+        self.limit = limit
+        self.free = []
+
+    @contextmanager
+    def buffer(self):
+        with self.lock:
+            buffer = self.free.pop() if self.free else None
+        if buffer is None:
+            buffer = bytearray(self.size)
+        try:
+            yield memoryview(buffer)
+        finally:
+            with self.lock:
+                if len(self.free) < self.limit:
+                    self.free.append(buffer)
+
+
+pool = BufferPool()
+
+
+class FrameReader:
+    """
+    Membaca pesan yang diakhiri "\\r\\n\\r\\n" dari socket. Data dikumpulkan
+    di satu bytearray dan terminator hanya dicari di byte yang baru masuk,
+    jadi tidak ada penggabungan string maupun scan ulang dari awal.
+    Sisa data setelah terminator disimpan untuk pesan berikutnya.
+    """
+    def __init__(self, connection, buffers=pool):
+        self.connection = connection
+        self.buffers = buffers
+        self.data = bytearray()
+        self.scan = 0
+
+    def read_frame(self):
+        # Kembalikan isi pesan tanpa terminator, atau None jika koneksi ditutup sebelum pesan lengkap
+        while (end := self.data.find(TERMINATOR, self.scan)) < 0:
+            self.scan = max(0, len(self.data) - len(TERMINATOR) + 1)
+            with self.buffers.buffer() as buffer:
+                n = self.connection.recv_into(buffer)
+                if not n:
+                    return None
+                self.data += buffer[:n]
+        frame = bytes(self.data[:end])
+        del self.data[:end + len(TERMINATOR)]
+        self.scan = 0
+        return frame